@@ -0,0 +1,200 @@
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Any, Callable
+
+from quest_master.core.database import Database
+from quest_master.core.template_engine import TemplateEngine, QR_URL, make_quest_context
+from quest_master.core.qr import QRService
+
+# Пропускная способность экспорта на синтетических квестах во временной базе:
+#   python -m quest_master.benchmarks.export --quests 50 --words 400 --json export.json
+#   python -m quest_master.benchmarks.export --compare export.json
+# Кэш рендера выключен, каждый документ рендерится заново. Пиковая память
+# меряется отдельным проходом под tracemalloc (только аллокации Python).
+
+STAGES = ("html", "pdf", "docx", "catalogue", "qr_png", "qr_svg")
+DIFFICULTIES = ("Легкий", "Средний", "Сложный", "Эпический")
+WORDS = (
+    "дракон", "руины", "артефакт", "гильдия", "таверна", "пророчество", "король",
+    "лес", "пещера", "клинок", "свиток", "маг", "стража", "золото", "тайна", "путь",
+)
+MEMORY_SAMPLE = 5
+
+
+@dataclass
+class StageResult:
+    template: str
+    stage: str
+    items: int = 0
+    seconds: float = 0.0
+    per_second: float = 0.0
+    peak_kb: float = 0.0
+    error: Optional[str] = None
+
+
+def make_fixtures(db: Database, count: int, words: int, seed: int = 42) -> List[int]:
+    rnd = random.Random(seed)
+    return db.bulk_create_quests(
+        {
+            "title": f"Бенчмарк {i}",
+            "difficulty": rnd.choice(DIFFICULTIES),
+            "reward": rnd.randint(10, 5000),
+            "description": "\n\n".join(
+                " ".join(rnd.choice(WORDS) for _ in range(50)) for _ in range(max(1, words // 50))
+            ),
+            "deadline": "2030-12-31",
+        }
+        for i in range(count)
+    )
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _measure(result: StageResult, run: Callable[[int], int], count: int) -> StageResult:
+    try:
+        started = time.perf_counter()
+        result.items = run(count)
+        result.seconds = time.perf_counter() - started
+        result.per_second = result.items / result.seconds if result.seconds else 0.0
+        tracemalloc.start()
+        try:
+            run(min(count, MEMORY_SAMPLE))
+            result.peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run(count: int = 20, words: int = 300, templates: Optional[List[str]] = None,
+        stages: Optional[List[str]] = None) -> Dict[str, Any]:
+    stages = list(stages or STAGES)
+    work_dir = tempfile.mkdtemp(prefix="qm-bench-")
+    db = Database(os.path.join(work_dir, "bench.db"))
+    try:
+        quest_ids = make_fixtures(db, count, words)
+        contexts = [make_quest_context(db.get_quest(qid), now="2030-01-01 00:00:00") for qid in quest_ids]
+        engine = TemplateEngine()
+        names = templates or engine.registry.names()
+        out_dir = os.path.join(work_dir, "out")
+        os.makedirs(out_dir)
+        results: List[StageResult] = []
+
+        for name in names:
+            def html(n: int, name=name) -> int:
+                for ctx in contexts[:n]:
+                    engine.render_from_file(name, ctx)
+                return n
+
+            def pdf(n: int, name=name) -> int:
+                for ctx in contexts[:n]:
+                    qr = QR_URL.format(ctx["quest"]["id"])
+                    engine.render_file_to_pdf(name, ctx, os.path.join(out_dir, "q.pdf"), embed_qr=qr)
+                return n
+
+            def docx(n: int, name=name) -> int:
+                for ctx in contexts[:n]:
+                    qr = QR_URL.format(ctx["quest"]["id"])
+                    engine.render_file_to_docx(name, ctx, os.path.join(out_dir, "q.docx"), embed_qr=qr)
+                return n
+
+            def catalogue(n: int, name=name) -> int:
+                return engine.render_catalogue_to_pdf(name, contexts[:n], os.path.join(out_dir, "c.pdf"))
+
+            for stage, fn in (("html", html), ("pdf", pdf), ("docx", docx), ("catalogue", catalogue)):
+                if stage in stages:
+                    # QR берутся из свежего кэша, чтобы каждый этап строил их сам
+                    engine.qr.clear()
+                    results.append(_measure(StageResult(name, stage), fn, count))
+
+        for fmt in ("png", "svg"):
+            if f"qr_{fmt}" in stages:
+                def qr(n: int, fmt=fmt) -> int:
+                    service = QRService(maxsize=0)
+                    for qid in quest_ids[:n]:
+                        service.data_uri(QR_URL.format(qid), fmt=fmt)
+                    return n
+
+                results.append(_measure(StageResult("-", f"qr_{fmt}"), qr, count))
+    finally:
+        db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quests": count,
+        "words": words,
+        "results": [asdict(r) for r in results],
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    before = {(r["template"], r["stage"]): r for r in baseline["results"]}
+    lines = []
+    for r in current["results"]:
+        old = before.get((r["template"], r["stage"]))
+        if not old or r["error"] or old["error"] or not old["per_second"]:
+            continue
+        ratio = r["per_second"] / old["per_second"]
+        lines.append(f"{r['template']:<22} {r['stage']:<10} {old['per_second']:9.2f} -> "
+                     f"{r['per_second']:9.2f} /с  ({ratio:.2f}x)")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк экспорта QuestMaster")
+    parser.add_argument("--quests", type=int, default=20)
+    parser.add_argument("--words", type=int, default=300, help="слов в описании квеста")
+    parser.add_argument("--template", action="append", dest="templates", help="по умолчанию все")
+    parser.add_argument("--stage", action="append", dest="stages", choices=STAGES, help="по умолчанию все")
+    parser.add_argument("--json", default=None, help="записать результаты в JSON")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    report = run(args.quests, args.words, args.templates, args.stages)
+    failed = False
+    print(f"ревизия {report['revision'] or '?'}, квестов: {report['quests']}, слов: {report['words']}")
+    for r in report["results"]:
+        if r["error"]:
+            failed = True
+            print(f"{r['template']:<22} {r['stage']:<10} ошибка: {r['error']}")
+        else:
+            print(f"{r['template']:<22} {r['stage']:<10} {r['per_second']:9.2f} /с  "
+                  f"{r['seconds']:8.3f} с  пик {r['peak_kb']:9.1f} КБ")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nсравнение с {baseline.get('revision') or args.compare}:")
+        for line in compare(report, baseline):
+            print(line)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Tuple
+
+# Время холодного импорта модулей приложения по данным `python -X importtime`.
+# Каждый замер — отдельный процесс, из повторов берётся самый быстрый.
+#   python -m quest_master.benchmarks.startup --json startup.json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_MODULES = ("quest_master.gui.main_window", "quest_master.core.template_engine")
+# Эти пакеты не должны загружаться при старте — только при первом экспорте
+HEAVY_PACKAGES = ("weasyprint", "docx", "qrcode", "PIL", "pydyf", "pypdf", "tinycss2", "cffi")
+
+
+@dataclass
+class ImportProfile:
+    module: str
+    wall_ms: float = 0.0
+    import_ms: float = 0.0
+    modules_loaded: int = 0
+    heavy_loaded: List[str] = field(default_factory=list)
+    slowest: List[Tuple[str, float]] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # "import time:       self [us] |  cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def profile_import(module: str, top: int = 15, python: str = sys.executable) -> ImportProfile:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (ROOT_DIR, env.get("PYTHONPATH")) if p)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    started = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=env, cwd=ROOT_DIR)
+    profile = ImportProfile(module, wall_ms=(time.perf_counter() - started) * 1000)
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        profile.error = tail[-1] if tail else f"код возврата {proc.returncode}"
+        return profile
+    names = {name for name, _, _ in rows}
+    profile.modules_loaded = len(rows)
+    profile.import_ms = next((cum for name, _, cum in rows if name == module), 0) / 1000
+    profile.heavy_loaded = sorted(p for p in HEAVY_PACKAGES if p in names)
+    profile.slowest = [(name, self_us / 1000)
+                       for name, self_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:top]]
+    return profile
+
+
+def run(modules: List[str], repeat: int = 5, top: int = 15) -> List[ImportProfile]:
+    results = []
+    for module in modules:
+        runs = [profile_import(module, top) for _ in range(max(1, repeat))]
+        results.append(min(runs, key=lambda p: (p.error is not None, p.wall_ms)))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замер времени старта QuestMaster")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", default=None, help="записать результаты в JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.repeat, args.top)
+    failed = False
+    for p in results:
+        print(f"== {p.module}")
+        if p.error:
+            failed = True
+            print(f"   ошибка: {p.error}")
+            continue
+        print(f"   процесс: {p.wall_ms:.1f} мс, импорт: {p.import_ms:.1f} мс, модулей: {p.modules_loaded}")
+        if p.heavy_loaded:
+            failed = True
+            print(f"   загружены при старте: {', '.join(p.heavy_loaded)}")
+        for name, ms in p.slowest:
+            print(f"   {ms:8.2f} мс  {name}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(p) for p in results], f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, parse_qs, unquote
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+GOOGLE_FONTS_HOST = "fonts.googleapis.com"
+# Кэшируются только шрифты и ресурсы из assets — их конечное число; предел на всякий случай
+CACHE_MAXSIZE = 256
+# data: (у каждого квеста свой QR) и локальные файлы читаются каждый раз и в кэш не попадают
+_UNCACHED_SCHEMES = ("data", "file", "")
+
+
+class AssetNotFound(IOError):
+    pass
+
+
+def font_slug(family: str) -> str:
+    # "Roboto+Slab:wght@400;700" -> "roboto-slab"
+    name = unquote(family.split(":", 1)[0]).replace("+", " ")
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+class AssetFetcher:
+    # url_fetcher для WeasyPrint: шрифты и картинки берутся из каталога assets,
+    # сетевые адреса не запрашиваются вовсе. Без этого каждый рендер ждёт таймаут
+    # на @import Google Fonts на машинах без интернета.
+
+    def __init__(self, assets_dir: Optional[str] = None):
+        self.assets_dir = os.path.abspath(assets_dir or ASSETS_DIR)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, url: str, timeout: int = 10, ssl_context=None) -> Dict[str, Any]:
+        if urlsplit(url).scheme in _UNCACHED_SCHEMES:
+            return self._resolve(url)
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None:
+                self._cache.move_to_end(url)
+                return dict(cached)
+        result = self._resolve(url)
+        with self._lock:
+            self._cache[url] = result
+            while len(self._cache) > CACHE_MAXSIZE:
+                self._cache.popitem(last=False)
+        return dict(result)
+
+    def _resolve(self, url: str) -> Dict[str, Any]:
+        parts = urlsplit(url)
+        if parts.scheme in _UNCACHED_SCHEMES:
+            from weasyprint.urls import default_url_fetcher
+            result = default_url_fetcher(url)
+            if "file_obj" in result:
+                with result.pop("file_obj") as f:
+                    result["string"] = f.read()
+            return result
+        if parts.netloc == GOOGLE_FONTS_HOST:
+            return self._google_fonts_css(parts.query)
+        # fonts.gstatic.com/s/cinzel/v23/x.ttf -> assets/fonts.gstatic.com/s/cinzel/v23/x.ttf
+        local = Path(self.assets_dir, parts.netloc, *[p for p in parts.path.split("/") if p])
+        if local.is_file():
+            return self._file(local)
+        raise AssetNotFound(f"Удалённый ресурс недоступен офлайн: {url}")
+
+    def _google_fonts_css(self, query: str) -> Dict[str, Any]:
+        css = []
+        redirected = None
+        for family in parse_qs(query).get("family", []):
+            path = Path(self.assets_dir, "fonts", f"{font_slug(family)}.css")
+            if path.is_file():
+                css.append(path.read_text(encoding="utf-8"))
+                redirected = redirected or path.as_uri()
+        # Нет локального шрифта — пустая таблица стилей: сработает запасной font-family
+        return {
+            "string": "\n".join(css).encode("utf-8"),
+            "mime_type": "text/css",
+            "encoding": "utf-8",
+            "redirected_url": redirected or Path(self.assets_dir, "fonts", "missing.css").as_uri(),
+        }
+
+    @staticmethod
+    def _file(path: Path) -> Dict[str, Any]:
+        mime_type, _ = mimetypes.guess_type(path.name)
+        return {
+            "string": path.read_bytes(),
+            "mime_type": mime_type or "application/octet-stream",
+            "redirected_url": path.as_uri(),
+        }
+
+
+_default_fetcher: Optional[AssetFetcher] = None
+
+
+def default_fetcher() -> AssetFetcher:
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = AssetFetcher()
+    return _default_fetcher
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, List
+
+from quest_master.core.database import Database, QUEST_FIELDS
+
+AUTOSAVE_IDLE_MS = 800
+AUTOSAVE_MAX_DELAY_MS = 5000
+# Потолок паузы между повторами, если база недоступна целиком (заблокирована, диск полон)
+AUTOSAVE_MAX_RETRY_MS = 60000
+
+# (id квеста, поля, которые база не приняла, ошибка); вызывается из потока автосохранения
+RejectedCallback = Callable[[int, List[str], Exception], None]
+
+
+class AutosaveBuffer:
+    # Изменения копятся в памяти по квестам, повторные правки одного поля
+    # схлопываются. Сброс — одной транзакцией в фоновом потоке после idle_ms
+    # тишины (но не позже max_delay_ms от первой правки) или явно через flush().
+    # Поток один на буфер: правки только сдвигают срок сброса.
+
+    def __init__(self, db: Database, idle_ms: int = AUTOSAVE_IDLE_MS,
+                 max_delay_ms: int = AUTOSAVE_MAX_DELAY_MS,
+                 on_rejected: Optional[RejectedCallback] = None):
+        self.db = db
+        self.idle = idle_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self.on_rejected = on_rejected
+        self.last_error: Optional[Exception] = None
+        # Квесты, отклонённые базой (например, повтор названия). Остальные поля квеста
+        # записываются по одному; отклонённые ждут следующей правки квеста или flush()
+        self.rejected: Dict[int, Exception] = {}
+        self._rejected_fields: Dict[int, Dict[str, Any]] = {}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._closed = False
+        self._first_change: Optional[float] = None
+        self._deadline: Optional[float] = None
+        self._retry_delay = self.idle
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def queue(self, quest_id: int, field: str, value: Any) -> None:
+        if field not in QUEST_FIELDS:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(quest_id, {})
+            self._restore_rejected(quest_id)
+            pending[field] = value
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            delay = min(self.idle, max(0.0, self._first_change + self.max_delay - now))
+            self._schedule(delay)
+
+    def has_pending(self, quest_id: Optional[int] = None) -> bool:
+        with self._lock:
+            if quest_id is None:
+                return bool(self._pending or self._rejected_fields)
+            return quest_id in self._pending or quest_id in self._rejected_fields
+
+    def discard(self, quest_id: int) -> None:
+        with self._lock:
+            self._pending.pop(quest_id, None)
+            self._rejected_fields.pop(quest_id, None)
+            self.rejected.pop(quest_id, None)
+
+    def flush(self) -> Dict[int, Exception]:
+        # Явный сброс повторяет и отклонённые ранее правки. Возвращает квесты, которые
+        # база так и не приняла; ошибка всей транзакции пробрасывается.
+        with self._lock:
+            self._deadline = None
+            for quest_id in list(self._rejected_fields):
+                self._restore_rejected(quest_id)
+        self._flush(raise_errors=True)
+        with self._lock:
+            return dict(self.rejected)
+
+    def close(self) -> Dict[int, Exception]:
+        try:
+            return self.flush()
+        finally:
+            with self._lock:
+                self._closed = True
+                self._deadline = None
+                self._wakeup.notify()
+
+    def _restore_rejected(self, quest_id: int) -> None:
+        # Вызывать под _lock: отклонённые поля возвращаются в очередь, свежие правки важнее
+        fields = self._rejected_fields.pop(quest_id, None)
+        if fields is None:
+            return
+        self.rejected.pop(quest_id, None)
+        pending = self._pending.setdefault(quest_id, {})
+        for key, old in fields.items():
+            pending.setdefault(key, old)
+
+    def _schedule(self, delay: float) -> None:
+        # Вызывать под _lock
+        if self._closed:
+            return
+        self._deadline = time.monotonic() + delay
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="autosave", daemon=True)
+            self._worker.start()
+        self._wakeup.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._deadline is not None:
+                        remaining = self._deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._wakeup.wait(remaining)
+                    else:
+                        self._wakeup.wait()
+                if self._closed:
+                    return
+                self._deadline = None
+            self._flush()
+
+    def _flush(self, raise_errors: bool = False) -> None:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._first_change = None
+            if not batch:
+                return
+            try:
+                failed = self.db.update_quests(batch)
+                rejected = {quest_id: self._save_by_field(quest_id, batch[quest_id], error)
+                            for quest_id, error in failed.items()}
+            except Exception as e:
+                self.last_error = e
+                with self._lock:
+                    # Более свежие изменения, пришедшие во время записи, важнее
+                    for quest_id, fields in batch.items():
+                        merged = dict(fields)
+                        merged.update(self._pending.get(quest_id, {}))
+                        self._pending[quest_id] = merged
+                    # Повтор с растущей паузой, иначе недоступная база опрашивается каждые idle_ms
+                    if self._first_change is None:
+                        self._first_change = time.monotonic()
+                    self._schedule(self._retry_delay)
+                    self._retry_delay = min(self._retry_delay * 2, AUTOSAVE_MAX_RETRY_MS / 1000.0)
+                if raise_errors:
+                    raise
+                return
+            with self._lock:
+                self._retry_delay = self.idle
+                for quest_id, (fields, error) in rejected.items():
+                    if not fields:
+                        continue
+                    self.rejected[quest_id] = error
+                    self._rejected_fields[quest_id] = fields
+                    self.last_error = error
+            if self.on_rejected is not None:
+                for quest_id, (fields, error) in rejected.items():
+                    if fields:
+                        self.on_rejected(quest_id, list(fields), error)
+
+    def _save_by_field(self, quest_id: int, fields: Dict[str, Any], error: Exception):
+        # Квест целиком отклонён — пишем поля по одному, чтобы одно конфликтующее
+        # (обычно название) не утянуло остальные правки. Возвращает непринятые поля.
+        if len(fields) == 1:
+            return dict(fields), error
+        rejected: Dict[str, Any] = {}
+        for key, value in fields.items():
+            failed = self.db.update_quests({quest_id: {key: value}})
+            if failed:
+                rejected[key] = value
+                error = failed[quest_id]
+        return rejected, error
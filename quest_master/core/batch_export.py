@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+from quest_master.core.database import Database
+from quest_master.core.template_engine import TemplateEngine, TEMPLATES_DIR, QR_URL, make_quest_context
+from quest_master.core.render_cache import RenderCache
+from quest_master.core.template_registry import BYTECODE_DIR
+
+
+@dataclass
+class ExportItem:
+    quest_id: int
+    output_path: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchResult:
+    items: List[ExportItem] = field(default_factory=list)
+    cancelled: bool = False
+
+    @property
+    def errors(self) -> Dict[int, str]:
+        return {item.quest_id: item.error for item in self.items if item.error}
+
+    @property
+    def exported(self) -> List[str]:
+        return [item.output_path for item in self.items if item.ok]
+
+
+ProgressCallback = Callable[[int, int, ExportItem], None]
+
+# Один TemplateEngine на процесс-воркер: WeasyPrint и окружение Jinja
+# загружаются при старте воркера, а не для каждого документа.
+_worker_engine: Optional[TemplateEngine] = None
+
+
+def _init_worker(templates_dir: str, cache_dir: Optional[str]) -> None:
+    global _worker_engine
+    cache = RenderCache(cache_dir) if cache_dir else None
+    _worker_engine = TemplateEngine(templates_dir, cache=cache, bytecode_dir=BYTECODE_DIR)
+
+
+def _render_pdf(template_name: str, context: Dict[str, Any], output_path: str,
+                qr_payload: Optional[str]) -> str:
+    _worker_engine.render_file_to_pdf(template_name, context, output_path, embed_qr=qr_payload)
+    return output_path
+
+
+class BatchExportEngine:
+    def __init__(self, db: Database, templates_dir: Optional[str] = None,
+                 max_workers: Optional[int] = None, cache_dir: Optional[str] = None):
+        self.db = db
+        self.templates_dir = os.path.abspath(templates_dir or TEMPLATES_DIR)
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def export(self, quest_ids: Iterable[int], template_name: str, output_dir: str,
+               embed_qr: bool = True, progress: Optional[ProgressCallback] = None,
+               cancel: Optional[threading.Event] = None) -> BatchResult:
+        quest_ids = list(quest_ids)
+        os.makedirs(output_dir, exist_ok=True)
+        result = BatchResult()
+        total = len(quest_ids)
+        pending: Dict[Future, ExportItem] = {}
+        remaining = iter(quest_ids)
+        # Пул ломается, если воркер умер (OOM, падение WeasyPrint): оставшиеся квесты
+        # не отправляются, а попадают в результат с этой ошибкой
+        broken: Optional[str] = None
+
+        # spawn, а не fork: родитель — процесс с Qt и открытыми соединениями SQLite
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                 initargs=(self.templates_dir, self.cache_dir),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+
+            def submit_next() -> bool:
+                nonlocal broken
+                for quest_id in remaining:
+                    item = ExportItem(quest_id, os.path.join(output_dir, f"quest_{quest_id}.pdf"))
+                    if broken is not None:
+                        item.error = broken
+                        self._finish(result, item, total, progress)
+                        continue
+                    quest = self.db.get_quest(quest_id)
+                    if quest is None:
+                        item.error = "Квест не найден"
+                        self._finish(result, item, total, progress)
+                        continue
+                    qr = QR_URL.format(quest_id) if embed_qr else None
+                    try:
+                        future = pool.submit(_render_pdf, template_name, make_quest_context(quest),
+                                             item.output_path, qr)
+                    except BrokenProcessPool as e:
+                        broken = f"{type(e).__name__}: {e}"
+                        item.error = broken
+                        self._finish(result, item, total, progress)
+                        continue
+                    pending[future] = item
+                    return True
+                return False
+
+            # Ограничиваем число задач в полёте, чтобы не держать контексты всех квестов в памяти
+            for _ in range(self.max_workers * 2):
+                if not submit_next():
+                    break
+
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    result.cancelled = True
+                    break
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        item.error = f"{type(e).__name__}: {e}"
+                    self._finish(result, item, total, progress)
+                    submit_next()
+        return result
+
+    @staticmethod
+    def _finish(result: BatchResult, item: ExportItem, total: int,
+                progress: Optional[ProgressCallback]) -> None:
+        result.items.append(item)
+        if progress:
+            progress(len(result.items), total, item)
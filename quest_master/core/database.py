@@ -1,180 +1,1028 @@
-from __future__ import annotations
-import sqlite3
-from typing import Optional, Dict, Any, List, Tuple
-import datetime
-import threading
-import os
-
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "quests.db")
-
-
-class Database:
-    def __init__(self, db_path: Optional[str] = None):
-        self.db_path = db_path or DB_PATH
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
-        self._lock = threading.Lock()
-        self._init_schema()
-
-    def _init_schema(self) -> None:
-        with self._lock, self._conn:
-            cur = self._conn.cursor()
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS quests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT UNIQUE NOT NULL,
-                    difficulty TEXT CHECK(difficulty IN ('Легкий','Средний','Сложный','Эпический')),
-                    reward INTEGER,
-                    description TEXT,
-                    deadline TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS quest_versions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    quest_id INTEGER,
-                    title TEXT,
-                    difficulty TEXT,
-                    reward INTEGER,
-                    description TEXT,
-                    created_at TIMESTAMP,
-                    FOREIGN KEY (quest_id) REFERENCES quests(id)
-                );
-                """
-            )
-
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS quest_locations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    quest_id INTEGER NOT NULL,
-                    x REAL NOT NULL,
-                    y REAL NOT NULL,
-                    type TEXT CHECK(type IN ('city','lair','tavern')),
-                    label TEXT,
-                    FOREIGN KEY (quest_id) REFERENCES quests(id)
-                );
-                """)
-            
-            self._conn.commit()
-
-    def create_quest(self, title: str, difficulty: str = "Легкий",
-                     reward: int = 10, description: str = "",
-                     deadline: Optional[str] = None) -> int:
-
-        with self._lock, self._conn:
-            cur = self._conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO quests (title, difficulty, reward, description, deadline)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (title, difficulty, reward, description, deadline),
-            )
-            quest_id = cur.lastrowid
-            self._insert_version(quest_id, title, difficulty, reward, description)
-            self._conn.commit()
-            return quest_id
-
-    def _insert_version(self, quest_id: int, title: str, difficulty: str,
-                        reward: int, description: str) -> None:
-        created_at = datetime.datetime.utcnow().isoformat()
-        cur = self._conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO quest_versions (quest_id, title, difficulty, reward, description, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (quest_id, title, difficulty, reward, description, created_at),
-        )
-
-    def update_quest(self, quest_id: int, fields: Dict[str, Any]) -> None:
-        allowed = {"title", "difficulty", "reward", "description", "deadline"}
-        set_parts = []
-        values = []
-        for k, v in fields.items():
-            if k in allowed:
-                set_parts.append(f"{k} = ?")
-                values.append(v)
-        if not set_parts:
-            return
-        values.append(quest_id)
-        with self._lock, self._conn:
-            cur = self._conn.cursor()
-            cur.execute(
-                f"UPDATE quests SET {', '.join(set_parts)} WHERE id = ?",
-                tuple(values),
-            )
-
-            cur.execute("SELECT title, difficulty, reward, description FROM quests WHERE id = ?", (quest_id,))
-            row = cur.fetchone()
-            if row:
-                self._insert_version(quest_id, row["title"], row["difficulty"], row["reward"], row["description"])
-            self._conn.commit()
-
-    def autosave_field(self, quest_id: int, field: str, value: Any) -> None:
-
-        if field not in {"title", "difficulty", "reward", "description", "deadline"}:
-            return
-        self.update_quest(quest_id, {field: value})
-
-    def get_quest(self, quest_id: int) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            cur = self._conn.cursor()
-            cur.execute("SELECT * FROM quests WHERE id = ?", (quest_id,))
-            row = cur.fetchone()
-            return dict(row) if row else None
-
-    def find_by_title(self, title: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            cur = self._conn.cursor()
-            cur.execute("SELECT * FROM quests WHERE title = ?", (title,))
-            row = cur.fetchone()
-            return dict(row) if row else None
-
-    def get_all_quests(self) -> list[dict]:
-        with self._lock:
-            cur = self._conn.cursor()
-            cur.execute("SELECT * FROM quests ORDER BY created_at DESC")
-            return [dict(row) for row in cur.fetchall()]
-
-    def close(self) -> None:
-        try:
-            self._conn.close()
-        except Exception:
-            pass
-        
-
-    def add_location(self, quest_id: int, x: float, y: float, type_: str, label: str = None):
-        with self._lock, self._conn:
-            cur = self._conn.cursor()
-            cur.execute("""
-                INSERT INTO quest_locations (quest_id, x, y, type, label)
-                VALUES (?, ?, ?, ?, ?)
-            """, (quest_id, x, y, type_, label))
-            self._conn.commit()
-
-    def delete_last_location(self, quest_id: int):
-        with self._lock, self._conn:
-            cur = self._conn.cursor()
-            cur.execute("""
-                DELETE FROM quest_locations
-                WHERE id = (
-                    SELECT id FROM quest_locations WHERE quest_id = ? ORDER BY id DESC LIMIT 1
-                )
-            """, (quest_id,))
-            self._conn.commit()
-
-    def get_locations(self, quest_id: int) -> List[Tuple[int, float, float, str, Optional[str]]]:
-        with self._lock:
-            cur = self._conn.cursor()
-            cur.execute("""
-                SELECT id, x, y, type, label FROM quest_locations
-                WHERE quest_id = ?
-                ORDER BY id ASC
-            """, (quest_id,))
-            return cur.fetchall()
+from __future__ import annotations
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Callable, Sequence, Iterable, Iterator
+import datetime
+import itertools
+import re
+import threading
+import queue
+import os
+from contextlib import contextmanager
+
+from quest_master.core.versions import VersionStore
+from quest_master.core.map_layers import (
+    MapLayers, encode_strokes, decode_strokes, encode_labels, decode_labels, encode_rect, decode_rect,
+    LEGACY_BACKGROUND_RECT,
+)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "quests.db")
+QUEST_FIELDS = {"title", "difficulty", "reward", "description", "deadline"}
+QUEST_COLUMNS = QUEST_FIELDS | {"id", "created_at"}
+SUMMARY_COLUMNS = ("id", "title", "difficulty", "reward", "deadline", "created_at")
+BULK_CHUNK_SIZE = 500
+EXPORT_FINISHED = ("done", "failed", "cancelled")
+# Задача в running без отметки живости дольше этого срока считается брошенной (секунды)
+EXPORT_STALE_SECONDS = 60
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@dataclass
+class ConnectionProfile:
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -32000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+
+    def apply(self, conn: sqlite3.Connection) -> None:
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}").fetchone()
+        conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+
+
+DEFAULT_PROFILE = ConnectionProfile()
+DEFAULT_READERS = 4
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    created: Tuple[int, ...] = ()
+    updated: Tuple[int, ...] = ()
+    deleted: Tuple[int, ...] = ()
+
+
+class ReaderPool:
+    # Соединения только для чтения. В режиме WAL читатели не ждут писателя,
+    # поэтому долгий экспорт не блокирует автосохранение и наоборот.
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int):
+        self._connect = connect
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+        return self._idle.get()
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._all.clear()
+
+
+def _ensure_columns(cur: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> None:
+    cur.execute(f"PRAGMA table_info({table})")
+    existing = {row["name"] for row in cur.fetchall()}
+    for name, decl in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _migrate_version_deltas(cur: sqlite3.Cursor) -> None:
+    _ensure_columns(cur, "quest_versions", {
+        "kind": "TEXT",
+        "parent_id": "INTEGER",
+        "delta": "BLOB",
+        "depth": "INTEGER DEFAULT 0",
+    })
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_quest_versions_quest_id ON quest_versions(quest_id, id)")
+
+
+def _migrate_lookup_indexes(cur: sqlite3.Cursor) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_quest_locations_quest_id ON quest_locations(quest_id, id)")
+    cur.execute("ANALYZE")
+
+
+def _migrate_keyset_index(cur: sqlite3.Cursor) -> None:
+    # Порядок списка — (created_at, id); запросы только по created_at индекс тоже покрывает
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_quests_created_at_id ON quests(created_at, id)")
+
+
+def _fold_yo(expr: str) -> str:
+    # «ё» и «е» занимают по 2 байта в UTF-8, так что смещения highlight() совпадают с исходным текстом
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _migrate_fulltext(cur: sqlite3.Cursor) -> None:
+    try:
+        cur.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS quests_fts USING fts5(
+                title, description,
+                content='quests', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite собран без FTS5 — поиск откатится на LIKE
+        return
+    new_values = f"new.id, {_fold_yo('new.title')}, {_fold_yo('new.description')}"
+    old_values = f"old.id, {_fold_yo('old.title')}, {_fold_yo('old.description')}"
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS quests_fts_ai AFTER INSERT ON quests BEGIN
+            INSERT INTO quests_fts(rowid, title, description) VALUES ({new_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS quests_fts_ad AFTER DELETE ON quests BEGIN
+            INSERT INTO quests_fts(quests_fts, rowid, title, description) VALUES ('delete', {old_values});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS quests_fts_au AFTER UPDATE OF title, description ON quests BEGIN
+            INSERT INTO quests_fts(quests_fts, rowid, title, description) VALUES ('delete', {old_values});
+            INSERT INTO quests_fts(rowid, title, description) VALUES ({new_values});
+        END
+    """)
+    cur.execute("INSERT INTO quests_fts(quests_fts) VALUES ('delete-all')")
+    cur.execute(
+        f"INSERT INTO quests_fts(rowid, title, description) "
+        f"SELECT id, {_fold_yo('title')}, {_fold_yo('description')} FROM quests"
+    )
+
+
+def _migrate_export_jobs(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quest_id INTEGER NOT NULL,
+            template TEXT NOT NULL,
+            format TEXT NOT NULL CHECK(format IN ('pdf','docx')),
+            output_path TEXT NOT NULL,
+            qr_payload TEXT,
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK(status IN ('queued','running','done','failed','cancelled')),
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, id)")
+
+
+def _migrate_map_layers(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quest_maps (
+            quest_id INTEGER PRIMARY KEY,
+            strokes BLOB,
+            labels TEXT,
+            background TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (quest_id) REFERENCES quests(id)
+        )
+        """
+    )
+
+
+def _migrate_spatial_index(cur: sqlite3.Cursor) -> None:
+    # R-tree по точкам интереса; quest_id — вспомогательный столбец, чтобы не ходить в основную таблицу
+    try:
+        cur.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS quest_locations_rtree "
+            "USING rtree(id, min_x, max_x, min_y, max_y, +quest_id)"
+        )
+    except sqlite3.OperationalError:
+        # SQLite собран без R-tree — выборка по окну пойдёт по обычному индексу
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_quest_locations_xy ON quest_locations(quest_id, x, y)")
+        return
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS quest_locations_rtree_ai AFTER INSERT ON quest_locations BEGIN
+            INSERT INTO quest_locations_rtree VALUES (new.id, new.x, new.x, new.y, new.y, new.quest_id);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS quest_locations_rtree_ad AFTER DELETE ON quest_locations BEGIN
+            DELETE FROM quest_locations_rtree WHERE id = old.id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS quest_locations_rtree_au AFTER UPDATE OF x, y, quest_id ON quest_locations BEGIN
+            UPDATE quest_locations_rtree
+            SET min_x = new.x, max_x = new.x, min_y = new.y, max_y = new.y, quest_id = new.quest_id
+            WHERE id = old.id;
+        END
+    """)
+    cur.execute("DELETE FROM quest_locations_rtree")
+    cur.execute("INSERT INTO quest_locations_rtree SELECT id, x, x, y, y, quest_id FROM quest_locations")
+
+
+def _migrate_export_heartbeat(cur: sqlite3.Cursor) -> None:
+    _ensure_columns(cur, "export_jobs", {"heartbeat_at": "TIMESTAMP"})
+
+
+def _migrate_background_rect(cur: sqlite3.Cursor) -> None:
+    # До тайлового фона картинка растягивалась на холст 800x600 — фиксируем это для старых карт
+    _ensure_columns(cur, "quest_maps", {"background_rect": "TEXT"})
+    cur.execute(
+        "UPDATE quest_maps SET background_rect = ? WHERE background IS NOT NULL AND background_rect IS NULL",
+        (encode_rect(LEGACY_BACKGROUND_RECT),),
+    )
+
+
+def _fts_query(text: str) -> str:
+    words = re.findall(r"\w+", text.replace("ё", "е").replace("Ё", "Е"))
+    return " ".join(f'"{w}"*' for w in words)
+
+
+# Номер миграции = PRAGMA user_version после её применения. Новые — только в конец списка.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _migrate_version_deltas,
+    _migrate_lookup_indexes,
+    _migrate_keyset_index,
+    _migrate_fulltext,
+    _migrate_export_jobs,
+    _migrate_map_layers,
+    _migrate_spatial_index,
+    _migrate_export_heartbeat,
+    _migrate_background_rect,
+]
+
+
+class Database:
+    def __init__(self, db_path: Optional[str] = None, profile: Optional[ConnectionProfile] = None,
+                 readers: int = DEFAULT_READERS):
+        self.db_path = db_path or DB_PATH
+        self.profile = profile or DEFAULT_PROFILE
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._versions = VersionStore()
+        self._listeners: List[Callable[[ChangeEvent], None]] = []
+        self._init_schema()
+        self._readers: Optional[ReaderPool] = None
+        self.has_fulltext = self._table_exists("quests_fts")
+        self.has_spatial_index = self._table_exists("quest_locations_rtree")
+        if readers > 0 and self.journal_mode == "wal":
+            self._readers = ReaderPool(self._connect_reader, readers)
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self.profile.apply(conn)
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def _table_exists(self, name: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+            return row is not None
+
+    @property
+    def journal_mode(self) -> str:
+        with self._lock:
+            return self._conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+    @contextmanager
+    def _read(self):
+        if self._readers is None:
+            with self._lock:
+                yield self._conn.cursor()
+        else:
+            with self._readers.connection() as conn:
+                yield conn.cursor()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            # auto_vacuum меняется только до создания первой таблицы, поэтому раньше профиля
+            cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.profile.apply(self._conn)
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT UNIQUE NOT NULL,
+                    difficulty TEXT CHECK(difficulty IN ('Легкий','Средний','Сложный','Эпический')),
+                    reward INTEGER,
+                    description TEXT,
+                    deadline TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quest_versions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    quest_id INTEGER,
+                    title TEXT,
+                    difficulty TEXT,
+                    reward INTEGER,
+                    description TEXT,
+                    created_at TIMESTAMP,
+                    FOREIGN KEY (quest_id) REFERENCES quests(id)
+                );
+                """
+            )
+
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS quest_locations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    quest_id INTEGER NOT NULL,
+                    x REAL NOT NULL,
+                    y REAL NOT NULL,
+                    type TEXT CHECK(type IN ('city','lair','tavern')),
+                    label TEXT,
+                    FOREIGN KEY (quest_id) REFERENCES quests(id)
+                );
+                """)
+
+            self._migrate(cur)
+            
+            self._conn.commit()
+
+    def _migrate(self, cur: sqlite3.Cursor) -> None:
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {number}")
+
+    def subscribe(self, listener: Callable[[ChangeEvent], None]) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[ChangeEvent], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: ChangeEvent) -> None:
+        # Вызывается после коммита и вне блокировки; слушатель может оказаться
+        # в фоновом потоке (автосохранение), GUI должен сам перейти в главный поток.
+        for listener in list(self._listeners):
+            listener(event)
+
+    @property
+    def schema_version(self) -> int:
+        with self._lock:
+            return self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def create_quest(self, title: str, difficulty: str = "Легкий",
+                     reward: int = 10, description: str = "",
+                     deadline: Optional[str] = None) -> int:
+
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            try:
+                cur.execute(
+                    """
+                    INSERT INTO quests (title, difficulty, reward, description, deadline)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (title, difficulty, reward, description, deadline),
+                )
+                quest_id = cur.lastrowid
+                self._insert_version(quest_id, title, difficulty, reward, description)
+                self._conn.commit()
+            except Exception:
+                self._versions.reset()
+                raise
+        self._notify(ChangeEvent(created=(quest_id,)))
+        return quest_id
+
+    def _insert_version(self, quest_id: int, title: str, difficulty: str,
+                        reward: int, description: str) -> None:
+        created_at = datetime.datetime.utcnow().isoformat()
+        self._versions.insert(self._conn.cursor(), quest_id, title, difficulty, reward,
+                              description, created_at)
+
+    def update_quest(self, quest_id: int, fields: Dict[str, Any]) -> None:
+        failed = self.update_quests({quest_id: fields})
+        if failed:
+            raise failed[quest_id]
+
+    def update_quests(self, changes: Dict[int, Dict[str, Any]]) -> Dict[int, sqlite3.IntegrityError]:
+        # Каждый квест — под своей точкой сохранения: повтор уникального названия
+        # откатывает только этот квест, остальные пишутся. Отклонённые возвращаются.
+        failed: Dict[int, sqlite3.IntegrityError] = {}
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            try:
+                if not self._conn.in_transaction:
+                    # Иначе RELEASE внешней точки сохранения коммитил бы каждый квест отдельно
+                    cur.execute("BEGIN")
+                for quest_id, fields in changes.items():
+                    cur.execute("SAVEPOINT quest_update")
+                    try:
+                        self._apply_update(cur, quest_id, fields)
+                    except sqlite3.IntegrityError as e:
+                        cur.execute("ROLLBACK TO quest_update")
+                        self._versions.reset(quest_id)
+                        failed[quest_id] = e
+                    cur.execute("RELEASE quest_update")
+                self._conn.commit()
+            except Exception:
+                # Откат транзакции делает закэшированные головы цепочек версий недействительными
+                self._versions.reset()
+                raise
+        updated = tuple(quest_id for quest_id in changes if quest_id not in failed)
+        if updated:
+            self._notify(ChangeEvent(updated=updated))
+        return failed
+
+    def bulk_create_quests(self, quests: Iterable[Dict[str, Any]],
+                           chunk_size: int = BULK_CHUNK_SIZE, keyframes: bool = True) -> List[int]:
+        # keyframes=False — история квестов будет импортирована следом, своя первая версия не нужна
+        ids: List[int] = []
+        for chunk in _chunks(quests, chunk_size):
+            rows = [
+                (q["title"], q.get("difficulty", "Легкий"), q.get("reward", 10),
+                 q.get("description", ""), q.get("deadline"), q.get("created_at"))
+                for q in chunk
+            ]
+            with self._lock, self._conn:
+                cur = self._conn.cursor()
+                try:
+                    cur.executemany(
+                        """
+                        INSERT INTO quests (title, difficulty, reward, description, deadline, created_at)
+                        VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                        """,
+                        rows,
+                    )
+                    # С AUTOINCREMENT и удерживаемой блокировкой записи id пачки идут подряд
+                    last = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'quests'").fetchone()[0]
+                    chunk_ids = list(range(last - len(rows) + 1, last + 1))
+                    if keyframes:
+                        created_at = datetime.datetime.utcnow().isoformat()
+                        self._versions.insert_keyframes(cur, (
+                            (quest_id, title, difficulty, reward, description, created_at)
+                            for quest_id, (title, difficulty, reward, description, _, _) in zip(chunk_ids, rows)
+                        ))
+                    self._conn.commit()
+                except Exception:
+                    self._versions.reset()
+                    raise
+            self._notify(ChangeEvent(created=tuple(chunk_ids)))
+            ids.extend(chunk_ids)
+        return ids
+
+    def bulk_update_quests(self, updates: Iterable[Tuple[int, Dict[str, Any]]],
+                           chunk_size: int = BULK_CHUNK_SIZE) -> List[int]:
+        updated: List[int] = []
+        for chunk in _chunks(updates, chunk_size):
+            # executemany требует одинакового SQL, поэтому группируем по набору полей
+            groups: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+            for quest_id, fields in chunk:
+                keys = tuple(sorted(k for k in fields if k in QUEST_FIELDS))
+                if keys:
+                    groups.setdefault(keys, []).append(tuple(fields[k] for k in keys) + (quest_id,))
+            chunk_ids = [row[-1] for rows in groups.values() for row in rows]
+            if not chunk_ids:
+                continue
+            with self._lock, self._conn:
+                cur = self._conn.cursor()
+                try:
+                    for keys, rows in groups.items():
+                        cur.executemany(
+                            f"UPDATE quests SET {', '.join(f'{k} = ?' for k in keys)} WHERE id = ?",
+                            rows,
+                        )
+                    marks = ", ".join("?" for _ in chunk_ids)
+                    cur.execute(
+                        f"SELECT id, title, difficulty, reward, description FROM quests WHERE id IN ({marks})",
+                        chunk_ids,
+                    )
+                    for row in cur.fetchall():
+                        self._versions.insert(cur, row["id"], row["title"], row["difficulty"], row["reward"],
+                                              row["description"], datetime.datetime.utcnow().isoformat())
+                    self._conn.commit()
+                except Exception:
+                    self._versions.reset()
+                    raise
+            self._notify(ChangeEvent(updated=tuple(chunk_ids)))
+            updated.extend(chunk_ids)
+        return updated
+
+    def bulk_add_versions(self, versions: Iterable[Dict[str, Any]],
+                          chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        count = 0
+        for chunk in _chunks(versions, chunk_size):
+            with self._lock, self._conn:
+                cur = self._conn.cursor()
+                try:
+                    for v in chunk:
+                        self._versions.insert(cur, v["quest_id"], v.get("title"), v.get("difficulty"),
+                                              v.get("reward"), v.get("description"), v.get("created_at"))
+                    self._conn.commit()
+                except Exception:
+                    self._versions.reset()
+                    raise
+            count += len(chunk)
+        return count
+
+    def bulk_add_locations(self, locations: Iterable[Dict[str, Any]],
+                           chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        count = 0
+        for chunk in _chunks(locations, chunk_size):
+            with self._lock, self._conn:
+                cur = self._conn.cursor()
+                cur.executemany(
+                    "INSERT INTO quest_locations (quest_id, x, y, type, label) VALUES (?, ?, ?, ?, ?)",
+                    [(loc["quest_id"], loc["x"], loc["y"], loc["type"], loc.get("label")) for loc in chunk],
+                )
+                self._conn.commit()
+            count += len(chunk)
+        return count
+
+    def iter_quests(self, batch_size: int = BULK_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        # Каждая страница читается отдельным коротким запросом, чтобы потребитель
+        # генератора мог писать в ту же базу, не упираясь в блокировку.
+        last_id = 0
+        while True:
+            with self._read() as cur:
+                cur.execute("SELECT * FROM quests WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+                page = [dict(row) for row in cur.fetchall()]
+            if not page:
+                return
+            yield from page
+            last_id = page[-1]["id"]
+
+    def iter_versions(self, batch_size: int = BULK_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        after = (0, 0)
+        state: Dict[str, Any] = {}
+        while True:
+            with self._read() as cur:
+                page = self._versions.read_page(cur, after, batch_size, state)
+            if not page:
+                return
+            yield from page
+            after = (page[-1]["quest_id"], page[-1]["id"])
+
+    def iter_locations(self, batch_size: int = BULK_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        last_id = 0
+        while True:
+            with self._read() as cur:
+                cur.execute(
+                    "SELECT id, quest_id, x, y, type, label FROM quest_locations WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                )
+                page = [dict(row) for row in cur.fetchall()]
+            if not page:
+                return
+            yield from page
+            last_id = page[-1]["id"]
+
+    def delete_quest(self, quest_id: int) -> None:
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            cur.execute("DELETE FROM quest_versions WHERE quest_id = ?", (quest_id,))
+            cur.execute("DELETE FROM quest_locations WHERE quest_id = ?", (quest_id,))
+            cur.execute("DELETE FROM quest_maps WHERE quest_id = ?", (quest_id,))
+            cur.execute("DELETE FROM quests WHERE id = ?", (quest_id,))
+            self._conn.commit()
+            self._versions.reset(quest_id)
+        self._notify(ChangeEvent(deleted=(quest_id,)))
+
+    def _apply_update(self, cur: sqlite3.Cursor, quest_id: int, fields: Dict[str, Any]) -> None:
+        set_parts = []
+        values = []
+        for k, v in fields.items():
+            if k in QUEST_FIELDS:
+                set_parts.append(f"{k} = ?")
+                values.append(v)
+        if not set_parts:
+            return
+        values.append(quest_id)
+        cur.execute(
+            f"UPDATE quests SET {', '.join(set_parts)} WHERE id = ?",
+            tuple(values),
+        )
+
+        cur.execute("SELECT title, difficulty, reward, description FROM quests WHERE id = ?", (quest_id,))
+        row = cur.fetchone()
+        if row:
+            self._insert_version(quest_id, row["title"], row["difficulty"], row["reward"], row["description"])
+
+    def autosave_field(self, quest_id: int, field: str, value: Any) -> None:
+
+        if field not in QUEST_FIELDS:
+            return
+        self.update_quest(quest_id, {field: value})
+
+    def get_quest(self, quest_id: int) -> Optional[Dict[str, Any]]:
+        with self._read() as cur:
+            cur.execute("SELECT * FROM quests WHERE id = ?", (quest_id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def find_by_title(self, title: str) -> Optional[Dict[str, Any]]:
+        with self._read() as cur:
+            cur.execute("SELECT * FROM quests WHERE title = ?", (title,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def quest_ids_by_title(self, titles: Sequence[str]) -> Dict[str, int]:
+        # Для импорта: какие из названий уже заняты (названия уникальны)
+        found: Dict[str, int] = {}
+        for chunk in _chunks(titles, BULK_CHUNK_SIZE):
+            marks = ", ".join("?" for _ in chunk)
+            with self._read() as cur:
+                cur.execute(f"SELECT id, title FROM quests WHERE title IN ({marks})", chunk)
+                found.update((row["title"], row["id"]) for row in cur.fetchall())
+        return found
+
+    def get_all_quests(self) -> list[dict]:
+        with self._read() as cur:
+            cur.execute("SELECT * FROM quests ORDER BY created_at DESC, id DESC")
+            return [dict(row) for row in cur.fetchall()]
+
+    def list_quests(self, after: Optional[Tuple[str, int]] = None, limit: int = 100,
+                    columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        # Постраничный список от новых к старым. after — (created_at, id) последней
+        # строки предыдущей страницы; id и created_at возвращаются всегда.
+        wanted = [c for c in (columns or SUMMARY_COLUMNS) if c in QUEST_COLUMNS]
+        for key in ("created_at", "id"):
+            if key not in wanted:
+                wanted.append(key)
+        sql = f"SELECT {', '.join(wanted)} FROM quests"
+        params: List[Any] = []
+        if after is not None:
+            sql += " WHERE (created_at, id) < (?, ?)"
+            params.extend(after)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._read() as cur:
+            cur.execute(sql, params)
+            return [dict(row) for row in cur.fetchall()]
+
+    def get_quest_summaries(self, quest_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        ids = list(quest_ids)
+        result: List[Dict[str, Any]] = []
+        with self._read() as cur:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ", ".join("?" for _ in chunk)
+                cur.execute(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM quests WHERE id IN ({marks})",
+                            chunk)
+                result.extend(dict(row) for row in cur.fetchall())
+        return result
+
+    def search_quests(self, query: str, limit: int = 50, offset: int = 0,
+                      mark: Tuple[str, str] = ("[", "]"),
+                      ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        # ids — проверить только эти квесты (точечное обновление результатов поиска)
+        match = _fts_query(query)
+        if not match:
+            return []
+        only = f"AND q.id IN ({', '.join('?' for _ in ids)})" if ids else ""
+        with self._read() as cur:
+            if self.has_fulltext:
+                cur.execute(
+                    f"""
+                    SELECT q.id, q.title, q.difficulty, q.reward, q.deadline, q.created_at,
+                           highlight(quests_fts, 0, ?, ?) AS title_hl,
+                           snippet(quests_fts, 1, ?, ?, '…', 16) AS snippet,
+                           quests_fts.rank AS rank
+                    FROM quests_fts JOIN quests q ON q.id = quests_fts.rowid
+                    WHERE quests_fts MATCH ? {only}
+                    ORDER BY quests_fts.rank
+                    LIMIT ? OFFSET ?
+                    """,
+                    (mark[0], mark[1], mark[0], mark[1], match, *(ids or ()), limit, offset),
+                )
+            else:
+                pattern = f"%{query.strip()}%"
+                cur.execute(
+                    f"""
+                    SELECT id, title, difficulty, reward, deadline, created_at,
+                           title AS title_hl, substr(description, 1, 120) AS snippet, 0 AS rank
+                    FROM quests q WHERE (title LIKE ? OR description LIKE ?) {only}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ? OFFSET ?
+                    """,
+                    (pattern, pattern, *(ids or ()), limit, offset),
+                )
+            return [dict(row) for row in cur.fetchall()]
+
+    def count_quests(self) -> int:
+        with self._read() as cur:
+            return cur.execute("SELECT COUNT(*) FROM quests").fetchone()[0]
+
+    def get_history(self, quest_id: int) -> List[Dict[str, Any]]:
+        with self._read() as cur:
+            return self._versions.list_history(cur, quest_id)
+
+    def get_version(self, version_id: int) -> Optional[Dict[str, Any]]:
+        with self._read() as cur:
+            return self._versions.get_version(cur, version_id)
+
+    def get_versioned_quest_ids(self) -> List[int]:
+        with self._read() as cur:
+            cur.execute("SELECT DISTINCT quest_id FROM quest_versions ORDER BY quest_id")
+            return [row[0] for row in cur.fetchall()]
+
+    def rewrite_history(self, quest_id: int, keep_ids: List[int]) -> int:
+        keep = set(keep_ids)
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            try:
+                history = self._versions.list_history(cur, quest_id)
+                if all(v["id"] in keep for v in history):
+                    return 0
+                kept = [self._versions.get_version(cur, v["id"]) for v in history if v["id"] in keep]
+                cur.execute("DELETE FROM quest_versions WHERE quest_id = ?", (quest_id,))
+                self._versions.reset(quest_id)
+                for v in kept:
+                    self._versions.insert(cur, quest_id, v["title"], v["difficulty"], v["reward"],
+                                          v["description"], v["created_at"])
+                self._conn.commit()
+            except Exception:
+                self._versions.reset()
+                raise
+            return len(history) - len(kept)
+
+    def prune_orphan_versions(self) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            cur.execute("DELETE FROM quest_versions WHERE quest_id NOT IN (SELECT id FROM quests)")
+            removed = cur.rowcount
+            self._conn.commit()
+            return removed
+
+    def file_size(self) -> int:
+        with self._lock:
+            page_size, page_count, _ = self._page_stats(self._conn.cursor())
+            return page_size * page_count
+
+    @staticmethod
+    def _page_stats(cur: sqlite3.Cursor) -> Tuple[int, int, int]:
+        return (cur.execute("PRAGMA page_size").fetchone()[0],
+                cur.execute("PRAGMA page_count").fetchone()[0],
+                cur.execute("PRAGMA freelist_count").fetchone()[0])
+
+    def vacuum(self) -> int:
+        # Возвращает освобождённые байты: на сколько страниц уменьшился файл
+        with self._lock:
+            cur = self._conn.cursor()
+            page_size, pages_before, _ = self._page_stats(cur)
+            if cur.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # Режим INCREMENTAL включается только полным VACUUM, дальше хватает incremental_vacuum
+                cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cur.execute("VACUUM")
+            else:
+                # incremental_vacuum освобождает по странице на шаг выполнения, а курсор
+                # делает один шаг — executescript прогоняет прагму до конца
+                free = self._page_stats(cur)[2]
+                while free:
+                    self._conn.executescript("PRAGMA incremental_vacuum")
+                    left = self._page_stats(cur)[2]
+                    if left >= free:
+                        break
+                    free = left
+            _, pages_after, _ = self._page_stats(cur)
+        return (pages_before - pages_after) * page_size
+
+    def enqueue_export(self, quest_id: int, template: str, fmt: str, output_path: str,
+                       qr_payload: Optional[str] = None) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO export_jobs (quest_id, template, format, output_path, qr_payload)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (quest_id, template, fmt, output_path, qr_payload),
+            )
+            return cur.lastrowid
+
+    def claim_export(self) -> Optional[Dict[str, Any]]:
+        # Старейшая задача в очереди переводится в running; условие по статусу
+        # не даёт второму экземпляру приложения забрать ту же задачу
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            while True:
+                row = cur.execute(
+                    "SELECT id FROM export_jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                cur.execute(
+                    "UPDATE export_jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, "
+                    "heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'queued'",
+                    (row["id"],),
+                )
+                if cur.rowcount:
+                    job = cur.execute("SELECT * FROM export_jobs WHERE id = ?", (row["id"],)).fetchone()
+                    return dict(job)
+
+    def finish_export(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE export_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, error, job_id),
+            )
+
+    def cancel_export(self, job_id: int) -> bool:
+        # Отменяется только ещё не начатая задача; рендер в процессе прерывает очередь
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE export_jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP "
+                "WHERE id = ? AND status = 'queued'",
+                (job_id,),
+            )
+            return cur.rowcount > 0
+
+    def touch_export(self, job_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE export_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+
+    def requeue_export(self, job_id: int) -> bool:
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE export_jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL "
+                "WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+            return cur.rowcount > 0
+
+    def requeue_stale_exports(self, stale_after: float = EXPORT_STALE_SECONDS) -> int:
+        # В очередь возвращаются только брошенные задачи: running без отметки живости
+        # дольше stale_after. Задачи, которые рендерит другой запущенный экземпляр, не трогаются.
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                """
+                UPDATE export_jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL
+                WHERE status = 'running'
+                  AND COALESCE(heartbeat_at, started_at, '') < datetime('now', ?)
+                """,
+                (f"-{int(stale_after)} seconds",),
+            )
+            return cur.rowcount
+
+    def clear_finished_exports(self) -> int:
+        marks = ", ".join("?" * len(EXPORT_FINISHED))
+        with self._lock, self._conn:
+            cur = self._conn.execute(f"DELETE FROM export_jobs WHERE status IN ({marks})", EXPORT_FINISHED)
+            return cur.rowcount
+
+    def get_export(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._read() as cur:
+            cur.execute("SELECT * FROM export_jobs WHERE id = ?", (job_id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def list_exports(self, limit: int = 200) -> List[Dict[str, Any]]:
+        with self._read() as cur:
+            cur.execute("SELECT * FROM export_jobs ORDER BY id DESC LIMIT ?", (limit,))
+            return [dict(row) for row in cur.fetchall()]
+
+    def close(self) -> None:
+        # Под замком записи: фоновая запись, начатая до закрытия, успевает закончиться
+        with self._lock:
+            if self._readers is not None:
+                self._readers.close()
+            try:
+                self._conn.execute("PRAGMA optimize")
+                self._conn.close()
+            except Exception:
+                pass
+        
+
+    def add_location(self, quest_id: int, x: float, y: float, type_: str, label: str = None) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            cur.execute("""
+                INSERT INTO quest_locations (quest_id, x, y, type, label)
+                VALUES (?, ?, ?, ?, ?)
+            """, (quest_id, x, y, type_, label))
+            self._conn.commit()
+            return cur.lastrowid
+
+    def apply_location_changes(self, quest_id: int, added: Sequence[Tuple[float, float, str, Optional[str]]],
+                               deleted: Sequence[int] = ()) -> List[int]:
+        # Накопленные правки карты одной транзакцией; возвращает id добавленных маркеров
+        ids = []
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            if deleted:
+                cur.executemany("DELETE FROM quest_locations WHERE id = ? AND quest_id = ?",
+                                [(location_id, quest_id) for location_id in deleted])
+            for x, y, type_, label in added:
+                cur.execute(
+                    "INSERT INTO quest_locations (quest_id, x, y, type, label) VALUES (?, ?, ?, ?, ?)",
+                    (quest_id, x, y, type_, label),
+                )
+                ids.append(cur.lastrowid)
+            self._conn.commit()
+        return ids
+
+    def save_map_layers(self, quest_id: int, layers: MapLayers) -> None:
+        # Вся карта квеста — одна строка: штрихи одним блобом, метки одним JSON
+        strokes = encode_strokes(layers.strokes) if layers.strokes else None
+        labels = encode_labels(layers.labels) if layers.labels else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO quest_maps (quest_id, strokes, labels, background, background_rect,
+                                                   updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (quest_id, strokes, labels, layers.background,
+                 encode_rect(layers.background_rect) if layers.background else None),
+            )
+
+    def load_map_layers(self, quest_id: int) -> MapLayers:
+        with self._read() as cur:
+            cur.execute("SELECT strokes, labels, background, background_rect FROM quest_maps WHERE quest_id = ?",
+                        (quest_id,))
+            row = cur.fetchone()
+        if row is None:
+            return MapLayers()
+        return MapLayers(decode_strokes(row["strokes"]), decode_labels(row["labels"]), row["background"],
+                         decode_rect(row["background_rect"]))
+
+    def get_locations(self, quest_id: int) -> List[Tuple[int, float, float, str, Optional[str]]]:
+        with self._read() as cur:
+            cur.execute("""
+                SELECT id, x, y, type, label FROM quest_locations
+                WHERE quest_id = ?
+                ORDER BY id ASC
+            """, (quest_id,))
+            return cur.fetchall()
+
+    def get_locations_in_rect(self, quest_id: int, x0: float, y0: float, x1: float, y1: float,
+                              limit: Optional[int] = None,
+                              after_id: int = 0) -> List[Tuple[int, float, float, str, Optional[str]]]:
+        # R-tree хранит координаты во float32 с округлением наружу, поэтому точное сравнение — по самой таблице.
+        # Порядок по id: с after_id и limit область читается страницами.
+        if self.has_spatial_index:
+            sql = """
+                SELECT l.id, l.x, l.y, l.type, l.label
+                FROM quest_locations_rtree r JOIN quest_locations l ON l.id = r.id
+                WHERE r.min_x <= ? AND r.max_x >= ? AND r.min_y <= ? AND r.max_y >= ? AND r.quest_id = ?
+                  AND l.x BETWEEN ? AND ? AND l.y BETWEEN ? AND ? AND l.id > ?
+                ORDER BY l.id
+            """
+            params = [x1, x0, y1, y0, quest_id, x0, x1, y0, y1, after_id]
+        else:
+            sql = """
+                SELECT id, x, y, type, label FROM quest_locations
+                WHERE quest_id = ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ? AND id > ?
+                ORDER BY id
+            """
+            params = [quest_id, x0, x1, y0, y1, after_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._read() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def iter_locations_in_rect(self, quest_id: int, x0: float, y0: float, x1: float, y1: float,
+                               batch_size: int = BULK_CHUNK_SIZE) -> Iterator[Tuple[int, float, float, str, Optional[str]]]:
+        last_id = 0
+        while True:
+            page = self.get_locations_in_rect(quest_id, x0, y0, x1, y1, batch_size, last_id)
+            if not page:
+                return
+            yield from page
+            last_id = page[-1][0]
+
+    def location_bounds(self, quest_id: int) -> Optional[Tuple[float, float, float, float]]:
+        with self._read() as cur:
+            cur.execute("SELECT min(x), min(y), max(x), max(y) FROM quest_locations WHERE quest_id = ?", (quest_id,))
+            row = cur.fetchone()
+        return None if row[0] is None else tuple(row)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Стили, которые заводятся в документе, если их нет в базовом .docx:
+# имя -> (базовый стиль, размер шрифта, жирный, цвет RGB)
+QUEST_STYLES = {
+    "Quest Title": ("Title", 26, True, (0x8B, 0x00, 0x00)),
+    "Quest Subtitle": ("Normal", 12, False, (0x66, 0x66, 0x66)),
+    "Quest Label": ("Normal", 11, True, (0x8B, 0x00, 0x00)),
+    "Quest Body": ("Normal", 11, False, None),
+    "Quest Footer": ("Normal", 9, False, (0x99, 0x99, 0x99)),
+}
+FIELD_LABELS = (
+    ("id", "Номер"),
+    ("difficulty", "Сложность"),
+    ("reward", "Награда"),
+    ("deadline", "Дедлайн"),
+)
+QR_WIDTH_CM = 4.0
+
+
+class DocxExporter:
+    # DOCX собирается прямо из контекста квеста (make_quest_context), а не из
+    # отрендеренного HTML. Базовый документ со стилями квеста готовится один
+    # раз и хранится байтами, каждый новый документ открывается из них;
+    # оформление задаётся стилями, а не шрифтом каждого фрагмента текста.
+
+    def __init__(self, base_template: Optional[str] = None, subtitle: Optional[str] = None):
+        self.base_template = base_template
+        self.subtitle = subtitle
+        self._base_bytes: Optional[bytes] = None
+        self._style_ids: Dict[str, str] = {}
+        self._table_style: Optional[str] = None
+
+    def _prepare_base(self) -> None:
+        from docx import Document
+
+        doc = Document(self.base_template) if self.base_template else Document()
+        self._ensure_styles(doc)
+        names = {style.name: style.style_id for style in doc.styles}
+        self._style_ids = {name: names[name] for name in QUEST_STYLES}
+        self._table_style = "Table Grid" if "Table Grid" in names else None
+        bio = BytesIO()
+        doc.save(bio)
+        self._base_bytes = bio.getvalue()
+
+    def new_document(self):
+        from docx import Document
+
+        if self._base_bytes is None:
+            self._prepare_base()
+        return Document(BytesIO(self._base_bytes))
+
+    def _paragraph(self, doc, text: str, style: str) -> None:
+        # Стиль ставится по готовому id: поиск стиля по имени в python-docx
+        # перебирает все стили документа на каждый абзац
+        doc.add_paragraph(text)._p.style = self._style_ids[style]
+
+    @staticmethod
+    def _ensure_styles(doc) -> None:
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.shared import Pt, RGBColor
+
+        existing = {style.name for style in doc.styles}
+        for name, (base, size, bold, color) in QUEST_STYLES.items():
+            if name in existing:
+                continue
+            style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+            if base in existing:
+                style.base_style = doc.styles[base]
+            style.font.size = Pt(size)
+            style.font.bold = bold
+            if color:
+                style.font.color.rgb = RGBColor(*color)
+
+    def write_quest(self, doc, context: Dict[str, Any], qr_png: Optional[bytes] = None) -> None:
+        from docx.shared import Cm
+
+        quest = context["quest"]
+        self._paragraph(doc, str(quest["title"]), "Quest Title")
+        if self.subtitle:
+            self._paragraph(doc, self.subtitle, "Quest Subtitle")
+
+        table = doc.add_table(rows=len(FIELD_LABELS), cols=2)
+        if self._table_style:
+            table.style = self._table_style
+        for row, (key, label) in zip(table.rows, FIELD_LABELS):
+            row.cells[0].paragraphs[0].add_run(label).bold = True
+            row.cells[1].paragraphs[0].add_run(str(quest.get(key, "")))
+
+        self._paragraph(doc, "Описание", "Quest Label")
+        for para in str(quest.get("description") or "").split("\n\n"):
+            if para.strip():
+                self._paragraph(doc, para.strip(), "Quest Body")
+
+        if qr_png:
+            doc.add_picture(BytesIO(qr_png), width=Cm(QR_WIDTH_CM))
+        if context.get("now"):
+            self._paragraph(doc, f"Создано {context['now']}", "Quest Footer")
+
+    def export(self, context: Dict[str, Any], output_path: str,
+               qr_png: Optional[bytes] = None) -> None:
+        doc = self.new_document()
+        self.write_quest(doc, context, qr_png)
+        doc.save(output_path)
+
+    def export_many(self, items: Iterable[Tuple[Dict[str, Any], Optional[bytes]]],
+                    output_path: str) -> int:
+        # Все квесты в одном документе, каждый с новой страницы
+        doc = self.new_document()
+        count = 0
+        for context, qr_png in items:
+            if count:
+                doc.add_page_break()
+            self.write_quest(doc, context, qr_png)
+            count += 1
+        doc.save(output_path)
+        return count
+
+
+_worker_exporter: Optional[DocxExporter] = None
+
+
+def _init_worker(base_template: Optional[str], subtitle: Optional[str]) -> None:
+    global _worker_exporter
+    _worker_exporter = DocxExporter(base_template, subtitle)
+
+
+def _export_one(context: Dict[str, Any], output_path: str, qr_png: Optional[bytes]) -> str:
+    _worker_exporter.export(context, output_path, qr_png)
+    return output_path
+
+
+def export_documents(items: Iterable[Tuple[Dict[str, Any], str, Optional[bytes]]],
+                     base_template: Optional[str] = None, subtitle: Optional[str] = None,
+                     max_workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    # Много отдельных документов в пуле процессов; результат: путь -> текст ошибки или None
+    items = list(items)
+    results: Dict[str, Optional[str]] = {}
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                             initializer=_init_worker, initargs=(base_template, subtitle),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [(path, pool.submit(_export_one, context, path, qr)) for context, path, qr in items]
+        for path, future in futures:
+            try:
+                future.result()
+                results[path] = None
+            except Exception as e:
+                results[path] = f"{type(e).__name__}: {e}"
+    return results
@@ -0,0 +1,198 @@
+from __future__ import annotations
+import os
+import threading
+from dataclasses import dataclass, fields
+from typing import Optional, Dict, Any, List, Callable, Set
+
+from quest_master.core.database import Database, EXPORT_FINISHED
+from quest_master.core.template_engine import TemplateEngine, make_quest_context
+
+POLL_INTERVAL = 2.0
+# Отметка живости текущей задачи; должна быть заметно чаще EXPORT_STALE_SECONDS
+HEARTBEAT_INTERVAL = 10.0
+# Сколько ждать текущий рендер при закрытии приложения (секунды)
+STOP_TIMEOUT = 3.0
+
+
+@dataclass
+class ExportJob:
+    id: int
+    quest_id: int
+    template: str
+    format: str
+    output_path: str
+    qr_payload: Optional[str] = None
+    status: str = "queued"
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "ExportJob":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in row.items() if k in names})
+
+    @property
+    def finished(self) -> bool:
+        return self.status in EXPORT_FINISHED
+
+
+JobListener = Callable[[ExportJob], None]
+
+
+class ExportQueue:
+    # Очередь экспорта хранится в таблице export_jobs и переживает перезапуск;
+    # фоновый поток забирает задачи по одной и рендерит их. Слушатели получают
+    # каждое изменение задачи из этого потока — GUI переносит их в главный поток сам.
+
+    def __init__(self, db: Database, engine: TemplateEngine, poll_interval: float = POLL_INTERVAL):
+        self.db = db
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._listeners: List[JobListener] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._current: Optional[int] = None
+        self._abandoned = False
+        self._cancelled: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: JobListener) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: JobListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, job: ExportJob) -> None:
+        for listener in list(self._listeners):
+            listener(job)
+
+    def _reload(self, job_id: int) -> Optional[ExportJob]:
+        row = self.db.get_export(job_id)
+        return ExportJob.from_row(row) if row else None
+
+    def enqueue(self, quest_id: int, template: str, fmt: str, output_path: str,
+                qr_payload: Optional[str] = None) -> ExportJob:
+        job_id = self.db.enqueue_export(quest_id, template, fmt.lower(), output_path, qr_payload)
+        job = self._reload(job_id)
+        self._notify(job)
+        self._wake.set()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        if self.db.cancel_export(job_id):
+            self._notify(self._reload(job_id))
+            return True
+        with self._lock:
+            if self._current == job_id:
+                # Рендер WeasyPrint не прервать на середине: результат будет отброшен
+                self._cancelled.add(job_id)
+                return True
+        return False
+
+    def jobs(self, limit: int = 200) -> List[ExportJob]:
+        return [ExportJob.from_row(row) for row in self.db.list_exports(limit)]
+
+    def clear_finished(self) -> int:
+        return self.db.clear_finished_exports()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.db.requeue_stale_exports()
+        self._stop.clear()
+        self._abandoned = False
+        self._thread = threading.Thread(target=self._run, name="export-queue", daemon=True)
+        self._thread.start()
+        self._heartbeat = threading.Thread(target=self._beat, name="export-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        # Текущая задача дорендеривается не дольше timeout. Если рендер не успел —
+        # задача возвращается в очередь, а её результат будет отброшен. False — не дождались.
+        self._stop.set()
+        self._wake.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        finished = not self._thread.is_alive()
+        if not finished:
+            with self._lock:
+                self._abandoned = True
+                job_id = self._current
+            if job_id is not None:
+                self.db.requeue_export(job_id)
+        self._thread = None
+        return finished
+
+    def _beat(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                job_id = self._current
+            if job_id is not None:
+                self.db.touch_export(job_id)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                # stop() мог сдаться и вернуть управление — база может быть уже закрыта
+                if self._abandoned:
+                    return
+                row = self.db.claim_export()
+                if row is None:
+                    # Заодно подбираем задачи упавших экземпляров
+                    self.db.requeue_stale_exports()
+            if row is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._process(ExportJob.from_row(row))
+
+    def _process(self, job: ExportJob) -> None:
+        with self._lock:
+            self._current = job.id
+        self._notify(job)
+        status, error = "done", None
+        try:
+            self._render(job)
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        # Запись результата — под тем же замком, под которым stop() отказывается от потока:
+        # либо результат записан до возврата из stop(), либо поток в базу больше не пишет
+        with self._lock:
+            self._current = None
+            if self._abandoned:
+                # Очередь остановлена, не дождавшись рендера: задача уже снова в очереди
+                return
+            if job.id in self._cancelled:
+                self._cancelled.discard(job.id)
+                status, error = "cancelled", None
+                if os.path.exists(job.output_path):
+                    os.remove(job.output_path)
+            self.db.finish_export(job.id, status, error)
+            finished = self._reload(job.id) or job
+        self._notify(finished)
+
+    def _render(self, job: ExportJob) -> None:
+        quest = self.db.get_quest(job.quest_id)
+        if quest is None:
+            raise LookupError("Квест не найден")
+        os.makedirs(os.path.dirname(os.path.abspath(job.output_path)), exist_ok=True)
+        context = make_quest_context(quest)
+        if job.format == "pdf":
+            self.engine.render_file_to_pdf(job.template, context, job.output_path, embed_qr=job.qr_payload)
+        elif job.format == "docx":
+            self.engine.render_file_to_docx(job.template, context, job.output_path, embed_qr=job.qr_payload)
+        else:
+            raise ValueError(f"Неизвестный формат: {job.format}")
@@ -0,0 +1,41 @@
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+
+Point = Tuple[float, float]
+
+
+def _segment_dist_sq(p: Point, a: Point, b: Point) -> float:
+    ax, ay = a
+    dx, dy = b[0] - ax, b[1] - ay
+    px, py = p[0] - ax, p[1] - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0.0:
+        return px * px + py * py
+    t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+    ex, ey = px - t * dx, py - t * dy
+    return ex * ex + ey * ey
+
+
+def simplify_rdp(points: Sequence[Point], epsilon: float) -> List[Point]:
+    # Рамер — Дуглас — Пекер без рекурсии: длинный штрих не упрётся в предел стека.
+    # Концы штриха сохраняются всегда.
+    n = len(points)
+    if n < 3 or epsilon <= 0:
+        return list(points)
+    eps_sq = epsilon * epsilon
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        a, b = points[start], points[end]
+        worst, worst_i = -1.0, -1
+        for i in range(start + 1, end):
+            d = _segment_dist_sq(points[i], a, b)
+            if d > worst:
+                worst, worst_i = d, i
+        if worst > eps_sq:
+            keep[worst_i] = True
+            stack.append((start, worst_i))
+            stack.append((worst_i, end))
+    return [p for p, k in zip(points, keep) if k]
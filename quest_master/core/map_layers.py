@@ -0,0 +1,142 @@
+from __future__ import annotations
+import json
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional, Tuple
+
+# Слои карты квеста: штрихи кисти одним бинарным блобом, метки — JSON,
+# фон — ссылка на файл. Формат блоба штрихов:
+#   b"QMS" | версия (1 байт) | режим (1 байт) | число штрихов (uint32)
+#   далее (в режиме "q" — сжатое zlib):
+#   на каждый штрих "<IfI": число точек, толщина, цвет ARGB
+#   координаты: "f" — float32 подряд; "q" — int32, первая точка штриха
+#   абсолютная, остальные — приращения, всё в 1/STROKE_SCALE единицы сцены.
+STROKES_MAGIC = b"QMS"
+STROKES_VERSION = 1
+# Точность режима "q": точки округляются до сетки 1/16 единицы сцены (ошибка до 1/32)
+# при первом сохранении; дальше они уже на сетке и повторные сохранения ничего не сдвигают.
+# Для сцены в пикселях фона это доли пикселя; если нужна исходная точность — режим "f"
+# (без сжатия, блоб в несколько раз больше).
+STROKE_SCALE = 16
+_HEADER = struct.Struct("<3sBcI")
+_STROKE_META = struct.Struct("<IfI")
+
+
+@dataclass
+class Stroke:
+    points: List[Tuple[float, float]]
+    width: float = 3.0
+    color: int = 0xFFA52A2A
+
+
+@dataclass
+class MapLabel:
+    x: float
+    y: float
+    text: str
+    font_size: int = 10
+    color: int = 0xFF000000
+
+
+# Прямоугольник фона в координатах сцены (x, y, ширина, высота): фон растягивается
+# на него, чтобы маркеры и штрихи оставались на своих местах при любом размере картинки
+Rect = Tuple[float, float, float, float]
+LEGACY_BACKGROUND_RECT: Rect = (0.0, 0.0, 800.0, 600.0)
+
+
+@dataclass
+class MapLayers:
+    strokes: List[Stroke] = field(default_factory=list)
+    labels: List[MapLabel] = field(default_factory=list)
+    background: Optional[str] = None
+    background_rect: Optional[Rect] = None
+
+
+def _le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_strokes(strokes: List[Stroke], mode: str = "q") -> bytes:
+    # "q" — приращения в целых с zlib (по умолчанию, в разы компактнее);
+    # "f" — сырые float32 без потерь точности
+    if mode not in ("q", "f"):
+        raise ValueError(f"Неизвестный режим кодирования штрихов: {mode}")
+    meta = bytearray()
+    coords = array("i" if mode == "q" else "f")
+    for stroke in strokes:
+        meta += _STROKE_META.pack(len(stroke.points), stroke.width, stroke.color & 0xFFFFFFFF)
+        if mode == "f":
+            for x, y in stroke.points:
+                coords.append(x)
+                coords.append(y)
+            continue
+        prev_x = prev_y = 0
+        for x, y in stroke.points:
+            qx, qy = round(x * STROKE_SCALE), round(y * STROKE_SCALE)
+            coords.append(qx - prev_x)
+            coords.append(qy - prev_y)
+            prev_x, prev_y = qx, qy
+    body = bytes(meta) + _le(coords)
+    if mode == "q":
+        body = zlib.compress(body, 6)
+    return _HEADER.pack(STROKES_MAGIC, STROKES_VERSION, mode.encode("ascii"), len(strokes)) + body
+
+
+def decode_strokes(blob: Optional[bytes]) -> List[Stroke]:
+    if not blob:
+        return []
+    magic, version, mode, count = _HEADER.unpack_from(blob)
+    if magic != STROKES_MAGIC or version != STROKES_VERSION:
+        raise ValueError("Неизвестный формат штрихов карты")
+    body = blob[_HEADER.size:]
+    if mode == b"q":
+        body = zlib.decompress(body)
+    meta_size = _STROKE_META.size * count
+    metas = list(_STROKE_META.iter_unpack(body[:meta_size]))
+    coords = _from_le("i" if mode == b"q" else "f", body[meta_size:])
+    strokes = []
+    pos = 0
+    for n, width, color in metas:
+        chunk = coords[pos:pos + 2 * n]
+        pos += 2 * n
+        if mode == b"q":
+            points = []
+            x = y = 0
+            for i in range(0, len(chunk), 2):
+                x += chunk[i]
+                y += chunk[i + 1]
+                points.append((x / STROKE_SCALE, y / STROKE_SCALE))
+        else:
+            points = list(zip(chunk[0::2], chunk[1::2]))
+        strokes.append(Stroke(points, width, color))
+    return strokes
+
+
+def encode_labels(labels: List[MapLabel]) -> str:
+    return json.dumps([asdict(label) for label in labels], ensure_ascii=False)
+
+
+def decode_labels(data: Optional[str]) -> List[MapLabel]:
+    return [MapLabel(**item) for item in json.loads(data)] if data else []
+
+
+def encode_rect(rect: Optional[Rect]) -> Optional[str]:
+    return json.dumps(list(rect)) if rect is not None else None
+
+
+def decode_rect(data: Optional[str]) -> Optional[Rect]:
+    return tuple(json.loads(data)) if data else None
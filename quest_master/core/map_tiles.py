@@ -0,0 +1,213 @@
+from __future__ import annotations
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Iterator, Optional, Tuple
+
+# Фон карты режется на пирамиду тайлов: уровень 0 — исходное разрешение,
+# каждый следующий вдвое меньше, пока изображение не влезет в один тайл.
+# Пирамида строится один раз и лежит на диске в TILES_DIR/<ключ>/<уровень>/<столбец>_<строка>.<формат>;
+# ключ зависит от пути, размера и времени изменения файла. manifest.json пишется последним —
+# его наличие означает, что пирамида достроена.
+TILES_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "map_tiles")
+TILE_SIZE = 256
+MANIFEST = "manifest.json"
+# Ограничение Pillow от «бомб» рассчитано на фото; карты мира бывают 20k+ пикселей по стороне
+MAX_BACKGROUND_PIXELS = 32_000 * 32_000
+# Сколько пирамид хранить на диске; лишние удаляются после сборки новой, давние — первыми
+MAX_PYRAMIDS = 8
+
+Progress = Callable[[int, int], None]
+# Два редактора с одним фоном не должны резать его в один каталог одновременно
+_BUILD_LOCK = threading.Lock()
+_PIL_LIMIT_LOCK = threading.Lock()
+
+
+@dataclass
+class TilePyramid:
+    directory: str
+    source: str
+    width: int
+    height: int
+    levels: int
+    tile_size: int = TILE_SIZE
+    format: str = "jpg"
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        factor = 1 << level
+        return max(1, math.ceil(self.width / factor)), max(1, math.ceil(self.height / factor))
+
+    def level_for_scale(self, scale: float) -> int:
+        # Самый мелкий уровень, у которого на пиксель экрана приходится не меньше пикселя тайла
+        if scale <= 0:
+            return self.levels - 1
+        level = int(math.floor(math.log2(1.0 / scale))) if scale < 1.0 else 0
+        return max(0, min(self.levels - 1, level))
+
+    def tiles_in_rect(self, level: int, x0: float, y0: float, x1: float, y1: float) -> Iterator[Tuple[int, int]]:
+        # Прямоугольник в координатах уровня 0 (пиксели исходного изображения)
+        span = self.tile_size << level
+        cols, rows = self.grid(level)
+        c0, c1 = max(0, int(x0 // span)), min(cols - 1, int(x1 // span))
+        r0, r1 = max(0, int(y0 // span)), min(rows - 1, int(y1 // span))
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                yield col, row
+
+    def grid(self, level: int) -> Tuple[int, int]:
+        w, h = self.level_size(level)
+        return math.ceil(w / self.tile_size), math.ceil(h / self.tile_size)
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.directory, str(level), f"{col}_{row}.{self.format}")
+
+
+def pyramid_key(path: str) -> str:
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def level_count(width: int, height: int, tile_size: int = TILE_SIZE) -> int:
+    side = max(width, height)
+    return 1 if side <= tile_size else math.ceil(math.log2(side / tile_size)) + 1
+
+
+def load_pyramid(path: str, cache_dir: Optional[str] = None) -> Optional[TilePyramid]:
+    manifest = os.path.join(cache_dir or TILES_DIR, pyramid_key(path), MANIFEST)
+    if not os.path.exists(manifest):
+        return None
+    with open(manifest, encoding="utf-8") as f:
+        data = json.load(f)
+    # Время манифеста — отметка использования для вытеснения старых пирамид
+    os.utime(manifest)
+    # Каталог данных могли перенести — тайлы ищем рядом с манифестом
+    data["directory"] = os.path.dirname(manifest)
+    return TilePyramid(**data)
+
+
+def build_pyramid(path: str, cache_dir: Optional[str] = None, tile_size: int = TILE_SIZE,
+                  progress: Optional[Progress] = None) -> TilePyramid:
+    # Долгая операция: вызывать из фонового потока. Готовая пирамида берётся из кэша.
+    with _BUILD_LOCK:
+        cached = load_pyramid(path, cache_dir)
+        if cached is not None and cached.tile_size == tile_size:
+            return cached
+        return _build(path, cache_dir, tile_size, progress)
+
+
+@contextmanager
+def _open_large(path: str):
+    # Предел Pillow от «бомб» снимается только на время чтения заголовка и под замком,
+    # размер проверяется своим пределом; остальной процесс работает со штатным ограничением
+    from PIL import Image
+
+    with _PIL_LIMIT_LOCK:
+        saved = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            image = Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = saved
+    try:
+        if image.width * image.height > MAX_BACKGROUND_PIXELS:
+            raise ValueError(f"Фон слишком большой: {image.width}x{image.height}")
+        yield image
+    finally:
+        image.close()
+
+
+def _save_tile(pyramid: TilePyramid, tile, level: int, col: int, row: int) -> None:
+    if pyramid.format == "jpg":
+        tile.save(pyramid.tile_path(level, col, row), "JPEG", quality=90)
+    else:
+        tile.save(pyramid.tile_path(level, col, row), "PNG", compress_level=1)
+
+
+def _build(path: str, cache_dir: Optional[str], tile_size: int, progress: Optional[Progress]) -> TilePyramid:
+    # Память: исходник декодируется один раз в своём режиме. Уровень 0 режется полосами
+    # высотой в тайл — конвертация режима идёт по полосе, второй полной копии нет, — и из
+    # тех же полос собирается уровень 1 (четверть исходника). Дальше уровни — из предыдущего.
+    from PIL import Image
+
+    directory = os.path.join(cache_dir or TILES_DIR, pyramid_key(path))
+    shutil.rmtree(directory, ignore_errors=True)
+    done = 0
+
+    def report(total: int) -> None:
+        nonlocal done
+        done += 1
+        if progress is not None:
+            progress(done, total)
+
+    with _open_large(path) as source:
+        has_alpha = source.mode in ("RGBA", "LA", "PA") or "transparency" in source.info
+        mode = "RGBA" if has_alpha else "RGB"
+        pyramid = TilePyramid(
+            directory=directory, source=os.path.abspath(path), width=source.width, height=source.height,
+            levels=level_count(source.width, source.height, tile_size), tile_size=tile_size,
+            format="png" if has_alpha else "jpg",
+        )
+        total = sum(cols * rows for cols, rows in (pyramid.grid(level) for level in range(pyramid.levels)))
+        os.makedirs(os.path.join(directory, "0"), exist_ok=True)
+        cols, rows = pyramid.grid(0)
+        image = Image.new(mode, pyramid.level_size(1)) if pyramid.levels > 1 else None
+        for row in range(rows):
+            top = row * tile_size
+            band = source.crop((0, top, source.width, min(source.height, top + tile_size)))
+            if band.mode != mode:
+                band = band.convert(mode)
+            for col in range(cols):
+                _save_tile(pyramid, band.crop((col * tile_size, 0, min(band.width, (col + 1) * tile_size),
+                                               band.height)), 0, col, row)
+                report(total)
+            if image is not None:
+                image.paste(band.reduce(2), (0, top // 2))
+            del band
+
+    for level in range(1, pyramid.levels):
+        os.makedirs(os.path.join(directory, str(level)), exist_ok=True)
+        cols, rows = pyramid.grid(level)
+        for row in range(rows):
+            for col in range(cols):
+                box = (col * tile_size, row * tile_size,
+                       min(image.width, (col + 1) * tile_size), min(image.height, (row + 1) * tile_size))
+                _save_tile(pyramid, image.crop(box), level, col, row)
+                report(total)
+        if level + 1 < pyramid.levels:
+            image = image.reduce(2)
+    image = None
+
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(asdict(pyramid), f)
+    prune_pyramids(cache_dir, keep=pyramid_key(path))
+    return pyramid
+
+
+def prune_pyramids(cache_dir: Optional[str] = None, max_pyramids: int = MAX_PYRAMIDS,
+                   keep: Optional[str] = None) -> int:
+    # Кэш тайлов — LRU по времени манифеста (load_pyramid его обновляет). Каталоги
+    # без манифеста — недостроенные пирамиды упавших сборок; вызывать под _BUILD_LOCK.
+    root = cache_dir or TILES_DIR
+    if not os.path.isdir(root):
+        return 0
+    complete, removed = [], 0
+    for entry in os.scandir(root):
+        if not entry.is_dir() or entry.name == keep:
+            continue
+        manifest = os.path.join(entry.path, MANIFEST)
+        if os.path.exists(manifest):
+            complete.append((os.path.getmtime(manifest), entry.path))
+        else:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    complete.sort(reverse=True)
+    for _, stale in complete[max(0, max_pyramids - (1 if keep else 0)):]:
+        shutil.rmtree(stale, ignore_errors=True)
+        removed += 1
+    return removed
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import base64
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+QR_CACHE_SIZE = 512
+QR_BORDER = 2
+# Меньше этого числа кодов пул процессов не окупает свой запуск
+PARALLEL_THRESHOLD = 64
+
+# Ключ кэша: (вид, данные, размер модуля, цвет, фон); вид — "png", "svg" или "uri:<формат>"
+QRKey = Tuple[str, str, int, str, str]
+
+
+def qr_matrix(payload: str) -> List[List[bool]]:
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, border=QR_BORDER)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_svg(matrix: List[List[bool]], box_size: int = 10, fill: str = "black",
+               back: str = "white") -> str:
+    # Соседние тёмные модули строки сливаются в один прямоугольник пути
+    size = len(matrix) * box_size
+    parts = []
+    for y, row in enumerate(matrix):
+        x, n = 0, len(row)
+        while x < n:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < n and row[x]:
+                x += 1
+            w = (x - start) * box_size
+            parts.append(f"M{start * box_size} {y * box_size}h{w}v{box_size}h-{w}z")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="{back}"/>'
+        f'<path fill="{fill}" d="{"".join(parts)}"/></svg>'
+    )
+
+
+def render_png(payload: str, box_size: int = 10, fill: str = "black", back: str = "white") -> bytes:
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=QR_BORDER)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color=fill, back_color=back)
+    bio = BytesIO()
+    img.save(bio, format="PNG")
+    return bio.getvalue()
+
+
+def _produce(key: QRKey) -> Any:
+    kind, payload, box_size, fill, back = key
+    if kind == "png":
+        return render_png(payload, box_size, fill, back)
+    if kind == "svg":
+        return render_svg(qr_matrix(payload), box_size, fill, back)
+    fmt = kind.split(":", 1)[1]
+    if fmt == "svg":
+        data = render_svg(qr_matrix(payload), box_size, fill, back).encode("utf-8")
+        mime = "image/svg+xml"
+    else:
+        data = render_png(payload, box_size, fill, back)
+        mime = "image/png"
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+class QRService:
+    # QR-коды с LRU-кэшем. По умолчанию в документы встраивается SVG: матрица
+    # сразу пишется путём, без растрового изображения и PNG-кодирования.
+
+    def __init__(self, maxsize: int = QR_CACHE_SIZE, box_size: int = 10, fill: str = "black",
+                 back: str = "white", image_format: str = "svg"):
+        if image_format not in ("svg", "png"):
+            raise ValueError(f"Неизвестный формат QR: {image_format}")
+        self.maxsize = maxsize
+        self.box_size = box_size
+        self.fill = fill
+        self.back = back
+        self.image_format = image_format
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[QRKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str, payload: str, box_size: Optional[int], fill: Optional[str],
+             back: Optional[str]) -> QRKey:
+        return (kind, payload, box_size or self.box_size, fill or self.fill, back or self.back)
+
+    def _lookup(self, key: QRKey) -> Any:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def _store(self, key: QRKey, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _get(self, key: QRKey) -> Any:
+        value = self._lookup(key)
+        if value is None:
+            value = _produce(key)
+            with self._lock:
+                self.misses += 1
+            self._store(key, value)
+        return value
+
+    def png(self, payload: str, box_size: Optional[int] = None, fill: Optional[str] = None,
+            back: Optional[str] = None) -> bytes:
+        return self._get(self._key("png", payload, box_size, fill, back))
+
+    def svg(self, payload: str, box_size: Optional[int] = None, fill: Optional[str] = None,
+            back: Optional[str] = None) -> str:
+        return self._get(self._key("svg", payload, box_size, fill, back))
+
+    def data_uri(self, payload: str, fmt: Optional[str] = None, box_size: Optional[int] = None,
+                 fill: Optional[str] = None, back: Optional[str] = None) -> str:
+        return self._get(self._key(f"uri:{fmt or self.image_format}", payload, box_size, fill, back))
+
+    def batch(self, payloads: Iterable[str], kind: str = "uri", fmt: Optional[str] = None,
+              max_workers: Optional[int] = None) -> Dict[str, Any]:
+        # Заранее строит коды для многих квестов; недостающие при большом объёме
+        # считаются в пуле процессов. kind: "uri", "svg" или "png".
+        kind = f"uri:{fmt or self.image_format}" if kind == "uri" else kind
+        keys = {p: self._key(kind, p, None, None, None) for p in payloads}
+        result: Dict[str, Any] = {}
+        missing: List[QRKey] = []
+        for payload, key in keys.items():
+            value = self._lookup(key)
+            if value is None:
+                missing.append(key)
+            else:
+                result[payload] = value
+        workers = max_workers or os.cpu_count() or 1
+        if len(missing) >= PARALLEL_THRESHOLD and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                produced = list(pool.map(_produce, missing, chunksize=16))
+        else:
+            produced = [_produce(key) for key in missing]
+        with self._lock:
+            self.misses += len(missing)
+        for key, value in zip(missing, produced):
+            self._store(key, value)
+            result[key[1]] = value
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Set
+
+from quest_master.core.database import Database, ChangeEvent
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "render_cache")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+VOLATILE_KEYS = {"now", "qr_img_data"}
+# Вытеснение освобождает место с запасом, чтобы не срабатывать на каждой записи
+CACHE_LOW_WATER = 0.9
+
+
+class RenderCache:
+    # Готовые документы на диске, ключ — хэш исходника шаблона, контекста без
+    # изменчивых полей, формата и содержимого QR. Имя файла начинается с id
+    # квеста, чтобы при его изменении можно было удалить все его записи.
+    # Индекс файлов держится в памяти (LRU-порядок, файлы по квестам, общий размер),
+    # каталог обходится только при создании. Воркеры пакетного экспорта пишут в тот же
+    # каталог своими экземплярами; чужие файлы процесс увидит при следующем запуске.
+    # Устаревшими они не бывают — ключ включает контекст квеста.
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir or CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._by_quest: Dict[str, Set[str]] = {}
+        self._total = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            self._rescan()
+
+    @staticmethod
+    def make_key(template_source: str, context: Dict[str, Any], fmt: str,
+                 qr_payload: Optional[str] = None) -> str:
+        stable = {k: v for k, v in context.items() if k not in VOLATILE_KEYS}
+        payload = json.dumps(
+            {"template": template_source, "context": stable, "format": fmt, "qr": qr_payload},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _name(quest_id: Any, key: str, fmt: str) -> str:
+        return f"q{quest_id}-{key}.{fmt}"
+
+    def _path(self, quest_id: Any, key: str, fmt: str) -> str:
+        return os.path.join(self.cache_dir, self._name(quest_id, key, fmt))
+
+    def fetch(self, quest_id: Any, key: str, fmt: str, output_path: str) -> bool:
+        path = self._path(quest_id, key, fmt)
+        try:
+            shutil.copyfile(path, output_path)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+            name = self._name(quest_id, key, fmt)
+            if name in self._sizes:
+                self._sizes.move_to_end(name)
+        return True
+
+    def store(self, quest_id: Any, key: str, fmt: str, source_path: str) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, tmp)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self._path(quest_id, key, fmt))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            self._add(self._name(quest_id, key, fmt), size)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def render(self, quest_id: Any, key: str, fmt: str, output_path: str,
+               produce: Callable[[], None]) -> bool:
+        if self.fetch(quest_id, key, fmt, output_path):
+            return True
+        produce()
+        self.store(quest_id, key, fmt, output_path)
+        return False
+
+    def invalidate_quest(self, quest_id: Any) -> int:
+        with self._lock:
+            names = self._by_quest.pop(str(quest_id), set())
+            for name in names:
+                self._total -= self._sizes.pop(name, 0)
+        removed = 0
+        for name in names:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def attach(self, db: Database) -> None:
+        db.subscribe(self._on_change)
+
+    def _on_change(self, event: ChangeEvent) -> None:
+        for quest_id in event.updated + event.deleted:
+            self.invalidate_quest(quest_id)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._sizes.clear()
+            self._by_quest.clear()
+            self._total = 0
+
+    @staticmethod
+    def _quest_of(name: str) -> str:
+        return name[1:].rsplit("-", 1)[0]
+
+    def _add(self, name: str, size: int) -> None:
+        self._total += size - self._sizes.pop(name, 0)
+        self._sizes[name] = size
+        self._by_quest.setdefault(self._quest_of(name), set()).add(name)
+
+    def _discard(self, name: str) -> None:
+        self._total -= self._sizes.pop(name, 0)
+        names = self._by_quest.get(self._quest_of(name))
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self._by_quest[self._quest_of(name)]
+
+    def _rescan(self) -> None:
+        # Полный обход каталога при создании. Вызывать под _lock.
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.startswith("q") and not entry.name.endswith(".tmp"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.name))
+        self._sizes.clear()
+        self._by_quest.clear()
+        self._total = 0
+        # LRU по mtime: fetch() обновляет время у каждого попадания
+        for _, size, name in sorted(entries):
+            self._add(name, size)
+
+    def _evict(self) -> None:
+        # Вызывать под _lock, когда индекс показал превышение предела
+        target = int(self.max_bytes * CACHE_LOW_WATER)
+        while self._total > target and self._sizes:
+            name = next(iter(self._sizes))
+            self._discard(name)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._sizes),
+                "bytes": self._total,
+            }
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import argparse
+import datetime
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Set, Callable
+
+from quest_master.core.database import Database
+
+
+@dataclass
+class RetentionPolicy:
+    keep_last: int = 20
+    hourly_for_hours: int = 48
+    daily_for_days: int = 90
+    burst_seconds: int = 60
+    keep_first: bool = True
+
+
+@dataclass
+class CompactionReport:
+    quests: int = 0
+    versions_removed: int = 0
+    orphans_removed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _parse_ts(value: Optional[str]) -> datetime.datetime:
+    if not value:
+        return datetime.datetime.min
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.datetime.min
+
+
+def select_versions(history: List[Dict[str, Any]], policy: RetentionPolicy,
+                    now: Optional[datetime.datetime] = None) -> Set[int]:
+    if not history:
+        return set()
+    now = now or datetime.datetime.utcnow()
+    ordered = sorted(history, key=lambda v: v["id"])
+    keep: Set[int] = {v["id"] for v in ordered[-policy.keep_last:]} if policy.keep_last > 0 else set()
+    keep.add(ordered[-1]["id"])
+    if policy.keep_first:
+        keep.add(ordered[0]["id"])
+
+    hourly_edge = now - datetime.timedelta(hours=policy.hourly_for_hours)
+    daily_edge = now - datetime.timedelta(days=policy.daily_for_days)
+    buckets: Set[str] = set()
+    next_ts: Optional[datetime.datetime] = None
+    # Идём от новых к старым: в каждом часе/дне остаётся самая свежая версия
+    for v in reversed(ordered):
+        ts = _parse_ts(v["created_at"])
+        in_burst = next_ts is not None and (next_ts - ts).total_seconds() < policy.burst_seconds
+        next_ts = ts
+        if v["id"] in keep or in_burst:
+            continue
+        if ts >= hourly_edge:
+            bucket = ts.strftime("h%Y-%m-%dT%H")
+        elif ts >= daily_edge:
+            bucket = ts.strftime("d%Y-%m-%d")
+        else:
+            continue
+        if bucket not in buckets:
+            buckets.add(bucket)
+            keep.add(v["id"])
+    return keep
+
+
+def compact_history(db: Database, policy: Optional[RetentionPolicy] = None, vacuum: bool = True,
+                    now: Optional[datetime.datetime] = None) -> CompactionReport:
+    policy = policy or RetentionPolicy()
+    report = CompactionReport(bytes_before=db.file_size())
+    report.orphans_removed = db.prune_orphan_versions()
+    for quest_id in db.get_versioned_quest_ids():
+        history = db.get_history(quest_id)
+        keep = select_versions(history, policy, now)
+        report.versions_removed += db.rewrite_history(quest_id, sorted(keep))
+        report.quests += 1
+    if vacuum:
+        db.vacuum()
+    report.bytes_after = db.file_size()
+    return report
+
+
+def compact_in_background(db: Database, policy: Optional[RetentionPolicy] = None,
+                          on_done: Optional[Callable[[CompactionReport], None]] = None) -> threading.Thread:
+    def run():
+        report = compact_history(db, policy)
+        if on_done:
+            on_done(report)
+
+    thread = threading.Thread(target=run, name="history-compaction", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    defaults = RetentionPolicy()
+    parser = argparse.ArgumentParser(description="Сжатие истории версий квестов")
+    parser.add_argument("db_path", nargs="?", default=None, help="путь к quests.db")
+    parser.add_argument("--keep-last", type=int, default=defaults.keep_last)
+    parser.add_argument("--hourly-hours", type=int, default=defaults.hourly_for_hours)
+    parser.add_argument("--daily-days", type=int, default=defaults.daily_for_days)
+    parser.add_argument("--burst-seconds", type=int, default=defaults.burst_seconds)
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args(argv)
+
+    policy = RetentionPolicy(
+        keep_last=args.keep_last,
+        hourly_for_hours=args.hourly_hours,
+        daily_for_days=args.daily_days,
+        burst_seconds=args.burst_seconds,
+    )
+    db = Database(args.db_path)
+    try:
+        report = compact_history(db, policy, vacuum=not args.no_vacuum)
+    finally:
+        db.close()
+    print(f"Квестов: {report.quests}, удалено версий: {report.versions_removed}, "
+          f"сирот: {report.orphans_removed}")
+    print(f"Размер: {report.bytes_before} -> {report.bytes_after} байт "
+          f"(освобождено {report.bytes_reclaimed})")
+
+
+if __name__ == "__main__":
+    main()
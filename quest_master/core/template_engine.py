@@ -1,121 +1,335 @@
-from __future__ import annotations
-import os
-from typing import Dict, Any, Optional
-from jinja2 import Environment, FileSystemLoader, select_autoescape, Template
-from weasyprint import HTML
-from docx import Document 
-from docx.shared import Pt
-import qrcode
-from io import BytesIO
-from PIL import Image
-import datetime
-from quest_master.core.database import Database
-
-
-class TemplateEngine:
-    def __init__(self, templates_dir: Optional[str] = None):
-        if templates_dir:
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            full_path = os.path.join(base_dir, templates_dir)
-            loader = FileSystemLoader(full_path)
-            self.env = Environment(
-                loader=loader,
-                autoescape=select_autoescape(["html", "xml"])
-            )
-        else:
-            self.env = Environment(autoescape=select_autoescape(["html", "xml"]))
-
-    def __init__(self, templates_dir: Optional[str] = None):
-        if templates_dir:
-            loader = FileSystemLoader(templates_dir)
-            self.env = Environment(
-                loader=loader,
-                autoescape=select_autoescape(["html", "xml"])
-            )
-        else:
-            self.env = Environment(autoescape=select_autoescape(["html", "xml"]))
-
-    def render_from_string(self, template_str: str, context: Dict[str, Any]) -> str:
-        tpl: Template = self.env.from_string(template_str)
-        return tpl.render(**context)
-
-    def render_from_file(self, template_name: str, context: Dict[str, Any]) -> str:
-        tpl = self.env.get_template(template_name)
-        return tpl.render(**context)
-
-    @staticmethod
-    def generate_qr(data: str, output_path: Optional[str] = None, box_size: int = 10) -> bytes:
-
-        qr = qrcode.QRCode(version=1, box_size=box_size, border=2)
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        bio = BytesIO()
-        img.save(bio, format="PNG")
-        png_bytes = bio.getvalue()
-        if output_path:
-            with open(output_path, "wb") as f:
-                f.write(png_bytes)
-        return png_bytes
-
-    @staticmethod
-    def html_to_pdf(html_str: str, output_path: str, base_url: Optional[str] = None) -> None:
-
-        HTML(string=html_str, base_url=base_url).write_pdf(output_path)
-
-
-    @staticmethod
-    def render_to_docx_from_text(text: str, output_path: str, title_style: bool = True) -> None:
-        doc = Document()
-        lines = text.splitlines()
-        if title_style and lines:
-            for i, line in enumerate(lines):
-                if line.strip():
-                    doc.add_heading(line.strip(), level=1)
-                    remaining = "\n".join(lines[i + 1 :]).strip()
-                    if remaining:
-                        for para in remaining.split("\n\n"):
-                            p = doc.add_paragraph(para.strip())
-                            for run in p.runs:
-                                run.font.size = Pt(11)
-                    break
-        else:
-            for para in "\n\n".join(lines).split("\n\n"):
-                p = doc.add_paragraph(para.strip())
-                for run in p.runs:
-                    run.font.size = Pt(11)
-
-        doc.save(output_path)
-
-    def render_context_to_pdf(self, template_str: str, context: Dict[str, Any], output_path: str,
-                              embed_qr: Optional[str] = None, base_url: Optional[str] = None) -> None:
-
-        if embed_qr:
-            png_bytes = self.generate_qr(embed_qr)
-            import base64
-            b64 = base64.b64encode(png_bytes).decode("ascii")
-            data_uri = f"data:image/png;base64,{b64}"
-            context = dict(context)
-            context["qr_img_data"] = data_uri
-
-        html = self.render_from_string(template_str, context)
-        self.html_to_pdf(html, output_path, base_url=base_url)
-
-    def render_context_to_docx(self, template_str: str, context: Dict[str, Any], output_path: str) -> None:
-        text = self.render_from_string(template_str, context)
-        self.render_to_docx_from_text(text, output_path)
-
-
-class BatchExporter:
-    @staticmethod
-    def generate_100_quests(db: Database, te: TemplateEngine, output_dir: str = "batch/"):
-        import os
-        os.makedirs(output_dir, exist_ok=True)
-        for i in range(100):
-            title = f"Batch Quest {i}"
-            quest_id = db.create_quest(title, "Легкий", 10, "Описание " * 50, "2025-12-31")
-            ctx = {"quest": db.get_quest(quest_id), "now": datetime.datetime.now().isoformat()}
-            html = te.render_from_file("royal_decree.html", ctx)
-            te.html_to_pdf(html, f"{output_dir}/quest_{i}.pdf")
-
+from __future__ import annotations
+import os
+import re
+import shutil
+import tempfile
+import datetime
+from typing import Dict, Any, Optional, Tuple, Iterable, List, TYPE_CHECKING
+from jinja2 import Environment, FileSystemLoader, select_autoescape, Template
+from quest_master.core.database import Database
+from quest_master.core.render_cache import RenderCache
+from quest_master.core.assets import default_fetcher
+from quest_master.core.template_registry import TemplateRegistry, CompiledTemplate, split_styles
+from quest_master.core.qr import QRService
+from quest_master.core.docx_export import DocxExporter
+
+if TYPE_CHECKING:
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+# WeasyPrint (с Pango), python-docx и qrcode импортируются при первом экспорте:
+# главное окно создаёт TemplateEngine при старте, а экспорт нужен не всегда.
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(PACKAGE_DIR, "templates")
+QR_URL = "https://example.com/quest/{}"
+_BODY_RE = re.compile(r"<body[^>]*>(.*)</body>", re.S | re.I)
+CATALOGUE_CHUNK = 25
+
+
+def make_quest_context(quest: Dict[str, Any], now: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "quest": {
+            "id": quest.get("id", "N/A"),
+            "title": quest["title"],
+            "difficulty": quest["difficulty"],
+            "reward": quest["reward"],
+            "description": quest["description"],
+            "deadline": quest["deadline"],
+        },
+        "now": now or datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def resolve_templates_dir(templates_dir: Optional[str] = None) -> str:
+    # Относительный путь считается от пакета quest_master, а не от текущего каталога
+    if not templates_dir:
+        return TEMPLATES_DIR
+    return os.path.abspath(os.path.join(PACKAGE_DIR, templates_dir))
+
+
+class TemplateEngine:
+    def __init__(self, templates_dir: Optional[str] = None, cache: Optional[RenderCache] = None,
+                 bytecode_dir: Optional[str] = None, qr: Optional[QRService] = None):
+        self.templates_dir = resolve_templates_dir(templates_dir)
+        if not os.path.isdir(self.templates_dir):
+            raise FileNotFoundError(f"Каталог шаблонов не найден: {self.templates_dir}")
+        self.cache = cache
+        self.qr = qr or QRService()
+        self.env = Environment(
+            loader=FileSystemLoader(self.templates_dir),
+            autoescape=select_autoescape(["html", "xml"])
+        )
+        self.registry = TemplateRegistry(self.env, self.templates_dir, bytecode_dir)
+        self._font_config: Optional[FontConfiguration] = None
+        self._prepared: Dict[str, Tuple[Template, Optional[CSS]]] = {}
+        self._stylesheets: Dict[str, CSS] = {}
+        self._docx: Dict[str, DocxExporter] = {}
+
+    @property
+    def font_config(self) -> FontConfiguration:
+        if self._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+            self._font_config = FontConfiguration()
+        return self._font_config
+
+    def render_from_string(self, template_str: str, context: Dict[str, Any]) -> str:
+        tpl: Template = self.env.from_string(template_str)
+        return tpl.render(**context)
+
+    def render_from_file(self, template_name: str, context: Dict[str, Any]) -> str:
+        tpl = self.env.get_template(template_name)
+        return tpl.render(**context)
+
+    def generate_qr(self, data: str, output_path: Optional[str] = None, box_size: int = 10) -> bytes:
+        png_bytes = self.qr.png(data, box_size=box_size)
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(png_bytes)
+        return png_bytes
+
+    @staticmethod
+    def html_to_pdf(html_str: str, output_path: str, base_url: Optional[str] = None,
+                    url_fetcher=None) -> None:
+        from weasyprint import HTML
+
+        HTML(string=html_str, base_url=base_url,
+             url_fetcher=url_fetcher or default_fetcher()).write_pdf(output_path)
+
+
+    @staticmethod
+    def render_to_docx_from_text(text: str, output_path: str, title_style: bool = True) -> None:
+        from docx import Document
+        from docx.shared import Pt
+
+        doc = Document()
+        lines = text.splitlines()
+        if title_style and lines:
+            for i, line in enumerate(lines):
+                if line.strip():
+                    doc.add_heading(line.strip(), level=1)
+                    remaining = "\n".join(lines[i + 1 :]).strip()
+                    if remaining:
+                        for para in remaining.split("\n\n"):
+                            p = doc.add_paragraph(para.strip())
+                            for run in p.runs:
+                                run.font.size = Pt(11)
+                    break
+        else:
+            for para in "\n\n".join(lines).split("\n\n"):
+                p = doc.add_paragraph(para.strip())
+                for run in p.runs:
+                    run.font.size = Pt(11)
+
+        doc.save(output_path)
+
+    def render_context_to_pdf(self, template_str: str, context: Dict[str, Any], output_path: str,
+                              embed_qr: Optional[str] = None, base_url: Optional[str] = None) -> None:
+        def produce():
+            self._write_pdf(self._prepare(template_str), self._with_qr(context, embed_qr),
+                            output_path, base_url)
+
+        self._render_cached("pdf", template_str, context, embed_qr, output_path, produce)
+
+    def render_file_to_pdf(self, template_name: str, context: Dict[str, Any], output_path: str,
+                           embed_qr: Optional[str] = None, base_url: Optional[str] = None) -> None:
+        compiled = self._compiled(template_name)
+
+        def produce():
+            self._write_pdf(self._prepare_compiled(compiled), self._with_qr(context, embed_qr),
+                            output_path, base_url)
+
+        self._render_cached("pdf", compiled.source, context, embed_qr, output_path, produce)
+
+    def _compiled(self, template_name: str) -> CompiledTemplate:
+        return self.registry.get(template_name)
+
+    def _stylesheet(self, css: Optional[str]) -> Optional[CSS]:
+        # CSS разбирается один раз с общей FontConfiguration: @import и @font-face
+        # разрешаются при первом рендере, а не для каждого документа
+        if css is None:
+            return None
+        sheet = self._stylesheets.get(css)
+        if sheet is None:
+            from weasyprint import CSS
+            sheet = CSS(string=css, font_config=self.font_config, url_fetcher=default_fetcher())
+            self._stylesheets[css] = sheet
+        return sheet
+
+    def _prepare(self, template_source: str) -> Tuple[Template, Optional[CSS]]:
+        prepared = self._prepared.get(template_source)
+        if prepared is None:
+            body, css = split_styles(template_source)
+            prepared = (self.env.from_string(body), self._stylesheet(css))
+            self._prepared[template_source] = prepared
+        return prepared
+
+    def _prepare_compiled(self, compiled: CompiledTemplate) -> Tuple[Template, Optional[CSS]]:
+        return compiled.template, self._stylesheet(compiled.css)
+
+    def _write_pdf(self, prepared: Tuple[Template, Optional[CSS]], context: Dict[str, Any],
+                   output_path: str, base_url: Optional[str] = None) -> None:
+        from weasyprint import HTML
+
+        tpl, css = prepared
+        html = tpl.render(**context)
+        HTML(string=html, base_url=base_url, url_fetcher=default_fetcher()).write_pdf(
+            output_path,
+            stylesheets=[css] if css is not None else None,
+            font_config=self.font_config,
+        )
+
+    def render_catalogue_to_pdf(self, template_name: str, contexts: Iterable[Dict[str, Any]],
+                                output_path: str, embed_qr: bool = True,
+                                chunk_size: int = CATALOGUE_CHUNK, single_document: bool = True,
+                                base_url: Optional[str] = None) -> int:
+        # Каталог: все квесты в одном PDF. Квесты раскладываются пачками по chunk_size —
+        # пачка идёт одним HTML с разрывами страниц (single_document) или отдельными
+        # документами. Каждая пачка сразу пишется во временный PDF, и её макет освобождается,
+        # так что в памяти не больше одной пачки; части потом склеиваются pypdf без перевёрстки.
+        # Шрифты встраиваются в каждую часть, поэтому файл чуть больше, чем при одном рендере.
+        # В режиме одного документа внешние отступы body есть только у первой страницы пачки.
+        from weasyprint import HTML
+
+        tpl, css = self._prepare_compiled(self._compiled(template_name))
+        stylesheets = [css] if css is not None else None
+        parts: List[str] = []
+        count = 0
+        work_dir = tempfile.mkdtemp(prefix="qm-catalogue-")
+
+        def layout(batch: List[str]) -> None:
+            for html in ([self._join_bodies(batch)] if single_document else batch):
+                part = os.path.join(work_dir, f"{len(parts):06d}.pdf")
+                HTML(string=html, base_url=base_url, url_fetcher=default_fetcher()).write_pdf(
+                    part, stylesheets=stylesheets, font_config=self.font_config)
+                parts.append(part)
+
+        def render_batch(batch: List[Dict[str, Any]]) -> None:
+            qr_links = [QR_URL.format(c["quest"]["id"]) if embed_qr else None for c in batch]
+            if embed_qr:
+                # QR всей пачки строятся разом, дальше _with_qr берёт их из кэша
+                self.qr.batch(qr_links)
+            layout([tpl.render(**self._with_qr(c, qr)) for c, qr in zip(batch, qr_links)])
+
+        try:
+            batch: List[Dict[str, Any]] = []
+            for context in contexts:
+                batch.append(context)
+                count += 1
+                if len(batch) >= chunk_size:
+                    render_batch(batch)
+                    batch = []
+            if batch:
+                render_batch(batch)
+            if not parts:
+                return 0
+            self._merge_pdfs(parts, output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return count
+
+    @staticmethod
+    def _merge_pdfs(parts: List[str], output_path: str) -> None:
+        if len(parts) == 1:
+            shutil.move(parts[0], output_path)
+            return
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        try:
+            for part in parts:
+                writer.append(part)
+            with open(output_path, "wb") as f:
+                writer.write(f)
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _join_bodies(htmls: List[str]) -> str:
+        match = _BODY_RE.search(htmls[0])
+        if match is None or len(htmls) == 1:
+            return "".join(htmls)
+        sections = []
+        for i, html in enumerate(htmls):
+            body = _BODY_RE.search(html)
+            style = ' style="break-before: page"' if i else ""
+            sections.append(f"<section{style}>{body.group(1) if body else html}</section>")
+        return htmls[0][:match.start(1)] + "".join(sections) + htmls[0][match.end(1):]
+
+    def _render_cached(self, fmt: str, template_source: str, context: Dict[str, Any],
+                       embed_qr: Optional[str], output_path: str, produce) -> None:
+        if self.cache is None:
+            produce()
+            return
+        quest_id = (context.get("quest") or {}).get("id", "none")
+        qr_key = f"{self.qr.image_format}:{embed_qr}" if embed_qr else None
+        key = self.cache.make_key(template_source, context, fmt, qr_key)
+        self.cache.render(quest_id, key, fmt, output_path, produce)
+
+    def _with_qr(self, context: Dict[str, Any], embed_qr: Optional[str]) -> Dict[str, Any]:
+        if not embed_qr:
+            return context
+        context = dict(context)
+        context["qr_img_data"] = self.qr.data_uri(embed_qr)
+        return context
+
+    def docx_exporter(self, template_name: Optional[str] = None) -> DocxExporter:
+        # Базовый документ — templates/<имя шаблона>.docx, если он лежит рядом с HTML
+        key = template_name or ""
+        exporter = self._docx.get(key)
+        if exporter is None:
+            base, subtitle = None, None
+            if template_name:
+                path = os.path.join(self.templates_dir, os.path.splitext(template_name)[0] + ".docx")
+                base = path if os.path.isfile(path) else None
+                subtitle = self._compiled(template_name).info.title
+            exporter = DocxExporter(base, subtitle)
+            self._docx[key] = exporter
+        return exporter
+
+    def render_context_to_docx(self, template_str: str, context: Dict[str, Any], output_path: str,
+                               embed_qr: Optional[str] = None) -> None:
+        # DOCX строится из контекста; HTML-шаблон участвует только в ключе кэша
+        def produce():
+            self.docx_exporter().export(context, output_path, self.qr.png(embed_qr) if embed_qr else None)
+
+        self._render_cached("docx", template_str, context, embed_qr, output_path, produce)
+
+    def render_file_to_docx(self, template_name: str, context: Dict[str, Any], output_path: str,
+                            embed_qr: Optional[str] = None) -> None:
+        compiled = self._compiled(template_name)
+        exporter = self.docx_exporter(template_name)
+
+        def produce():
+            exporter.export(context, output_path, self.qr.png(embed_qr) if embed_qr else None)
+
+        self._render_cached("docx", compiled.source, context, embed_qr, output_path, produce)
+
+    def render_catalogue_to_docx(self, template_name: str, contexts: Iterable[Dict[str, Any]],
+                                 output_path: str, embed_qr: bool = True) -> int:
+        def items():
+            for context in contexts:
+                qr = QR_URL.format(context["quest"]["id"]) if embed_qr else None
+                yield context, self.qr.png(qr) if qr else None
+
+        return self.docx_exporter(template_name).export_many(items(), output_path)
+
+
+class BatchExporter:
+    @staticmethod
+    def generate_100_quests(db: Database, te: TemplateEngine, output_dir: str = "batch/"):
+        from quest_master.core.batch_export import BatchExportEngine
+        quest_ids = db.bulk_create_quests(
+            {"title": f"Batch Quest {i}", "difficulty": "Легкий", "reward": 10,
+             "description": "Описание " * 50, "deadline": "2025-12-31"}
+            for i in range(100)
+        )
+        return BatchExportEngine(db, te.templates_dir).export(quest_ids, "royal_decree.html", output_dir)
+
+    @staticmethod
+    def export_catalogue(db: Database, te: TemplateEngine, quest_ids: Iterable[int],
+                         template_name: str, output_path: str, embed_qr: bool = True) -> int:
+        # Квесты читаются по одному по мере раскладки, а не списком целиком
+        contexts = (make_quest_context(quest) for quest in map(db.get_quest, quest_ids) if quest)
+        return te.render_catalogue_to_pdf(template_name, contexts, output_path, embed_qr=embed_qr)
+
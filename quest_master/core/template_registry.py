@@ -0,0 +1,99 @@
+from __future__ import annotations
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, Template
+
+BYTECODE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "template_cache")
+TEMPLATE_SUFFIX = ".html"
+_STYLE_RE = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.S | re.I)
+
+
+def split_styles(source: str) -> Tuple[str, Optional[str]]:
+    # Вынимает <style> из шаблона: разметка компилируется Jinja, а CSS разбирается
+    # WeasyPrint один раз. Стили с выражениями Jinja остаются в разметке.
+    styles = _STYLE_RE.findall(source)
+    if not styles or any("{{" in st or "{%" in st for st in styles):
+        return source, None
+    return _STYLE_RE.sub("", source), "\n".join(styles)
+
+
+@dataclass
+class TemplateInfo:
+    name: str
+    title: str
+    path: str
+    mtime: float
+
+
+@dataclass
+class CompiledTemplate:
+    info: TemplateInfo
+    source: str
+    template: Template
+    css: Optional[str]
+
+
+class TemplateRegistry:
+    # Все шаблоны каталога templates/, скомпилированные один раз. get() сверяет
+    # mtime файла и перекомпилирует изменённый шаблон, так что правки в
+    # templates/*.html подхватываются без перезапуска.
+
+    def __init__(self, env: Environment, templates_dir: str, bytecode_dir: Optional[str] = None):
+        self.env = env
+        self.templates_dir = os.path.abspath(templates_dir)
+        self._bytecode = None
+        if bytecode_dir:
+            os.makedirs(bytecode_dir, exist_ok=True)
+            self._bytecode = FileSystemBytecodeCache(os.path.abspath(bytecode_dir))
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.templates_dir) if n.endswith(TEMPLATE_SUFFIX))
+
+    def templates(self) -> List[TemplateInfo]:
+        return [self.get(name).info for name in self.names()]
+
+    def get(self, name: str) -> CompiledTemplate:
+        path = os.path.join(self.templates_dir, name)
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            compiled = self._compiled.get(name)
+            if compiled is None or compiled.info.mtime != mtime:
+                compiled = self._compile(name, path, mtime)
+                self._compiled[name] = compiled
+            return compiled
+
+    def _compile(self, name: str, path: str, mtime: float) -> CompiledTemplate:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        body, css = split_styles(source)
+        title = _TITLE_RE.search(source)
+        info = TemplateInfo(name, title.group(1).strip() if title else os.path.splitext(name)[0],
+                            path, mtime)
+        # Байткод на диске ключуется по имени и хэшу исходника, поэтому переживает
+        # перезапуск и общий у процессов пакетного экспорта
+        bucket = None
+        code = None
+        if self._bytecode is not None:
+            bucket = self._bytecode.get_bucket(self.env, name, path, body)
+            code = bucket.code
+        if code is None:
+            code = self.env.compile(body, name, path)
+            if bucket is not None:
+                bucket.code = code
+                self._bytecode.set_bucket(bucket)
+        template = Template.from_code(self.env, code, self.env.make_globals(None))
+        return CompiledTemplate(info, source, template, css)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(name, None)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+from dataclasses import dataclass
+import itertools
+from typing import Optional, Dict, Any, List, Iterable, Iterator, TextIO, Callable
+
+from quest_master.core.database import Database, BULK_CHUNK_SIZE
+
+FIELDS = {
+    "quests": ("id", "title", "difficulty", "reward", "description", "deadline", "created_at"),
+    "versions": ("id", "quest_id", "title", "difficulty", "reward", "description", "created_at"),
+    "locations": ("id", "quest_id", "x", "y", "type", "label"),
+}
+_INT_FIELDS = {"id", "quest_id", "reward"}
+_FLOAT_FIELDS = {"x", "y"}
+# Порядок важен: версии и локации ссылаются на квесты
+TABLES = ("quests", "versions", "locations")
+
+
+@dataclass
+class ImportStats:
+    imported: int = 0
+    skipped: int = 0
+
+
+def iter_records(db: Database, table: str) -> Iterator[Dict[str, Any]]:
+    if table == "quests":
+        source = db.iter_quests()
+    elif table == "versions":
+        source = db.iter_versions()
+    elif table == "locations":
+        source = db.iter_locations()
+    else:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    fields = FIELDS[table]
+    for record in source:
+        yield {k: record.get(k) for k in fields}
+
+
+def write_jsonl(records: Iterable[Dict[str, Any]], fp: TextIO) -> int:
+    count = 0
+    for record in records:
+        fp.write(json.dumps(record, ensure_ascii=False))
+        fp.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(records: Iterable[Dict[str, Any]], fp: TextIO, fields: Iterable[str]) -> int:
+    writer = csv.DictWriter(fp, fieldnames=list(fields))
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def read_jsonl(fp: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(fp: TextIO) -> Iterator[Dict[str, Any]]:
+    for row in csv.DictReader(fp):
+        record: Dict[str, Any] = {}
+        for key, value in row.items():
+            if value == "":
+                record[key] = None
+            elif key in _INT_FIELDS:
+                record[key] = int(value)
+            elif key in _FLOAT_FIELDS:
+                record[key] = float(value)
+            else:
+                record[key] = value
+        yield record
+
+
+def export_table(db: Database, table: str, fp: TextIO, fmt: str = "jsonl") -> int:
+    records = iter_records(db, table)
+    if fmt == "csv":
+        return write_csv(records, fp, FIELDS[table])
+    return write_jsonl(records, fp)
+
+
+def import_table(db: Database, table: str, records: Iterable[Dict[str, Any]],
+                 id_map: Optional[Dict[int, int]] = None, stats: Optional[ImportStats] = None,
+                 keyframes: bool = True,
+                 on_chunk: Optional[Callable[[Dict[int, int]], None]] = None) -> Dict[int, int]:
+    # Квесты получают новые id; возвращаемое отображение старый id -> новый
+    # обязательно для импорта версий и локаций. Записи квестов, которых нет
+    # в отображении, пропускаются — иначе они прицепились бы к чужому квесту.
+    # keyframes=False — не создавать первую версию квеста, если история импортируется следом.
+    stats = stats if stats is not None else ImportStats()
+    if table == "quests":
+        # Квесты пишутся пачками, каждая — своей транзакцией. Названия, которые уже есть
+        # в базе (повторный импорт, продолжение упавшего), пропускаются и в отображение
+        # не попадают; on_chunk получает отображение после каждой записанной пачки.
+        id_map = id_map if id_map is not None else {}
+        it = iter(records)
+        while True:
+            chunk = list(itertools.islice(it, BULK_CHUNK_SIZE))
+            if not chunk:
+                break
+            taken = set(db.quest_ids_by_title([record["title"] for record in chunk]))
+            fresh = []
+            for record in chunk:
+                if record["title"] in taken:
+                    stats.skipped += 1
+                    continue
+                taken.add(record["title"])
+                fresh.append(record)
+            if not fresh:
+                continue
+            new_ids = db.bulk_create_quests(fresh, keyframes=keyframes)
+            for record, new in zip(fresh, new_ids):
+                if record.get("id") is not None:
+                    id_map[record["id"]] = new
+            stats.imported += len(new_ids)
+            if on_chunk is not None:
+                on_chunk(id_map)
+        return id_map
+
+    if table not in ("versions", "locations"):
+        raise ValueError(f"Неизвестная таблица: {table}")
+    if id_map is None:
+        raise ValueError(f"Для импорта таблицы {table} нужно отображение id квестов")
+
+    def remapped():
+        for record in records:
+            quest_id = id_map.get(record.get("quest_id"))
+            if quest_id is None:
+                stats.skipped += 1
+                continue
+            record = dict(record)
+            record["quest_id"] = quest_id
+            yield record
+
+    if table == "versions":
+        stats.imported += db.bulk_add_versions(remapped())
+    else:
+        stats.imported += db.bulk_add_locations(remapped())
+    return id_map
+
+
+def read_id_map(path: str) -> Dict[int, int]:
+    with open(path, encoding="utf-8") as f:
+        return {int(old): new for old, new in json.load(f).items()}
+
+
+def write_id_map(id_map: Dict[int, int], path: str) -> None:
+    # Через временный файл: отображение перезаписывается после каждой пачки квестов
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({str(old): new for old, new in id_map.items()}, f)
+    os.replace(tmp, path)
+
+
+def _table_path(directory: str, table: str, fmt: str) -> str:
+    return os.path.join(directory, f"{table}.{fmt}")
+
+
+def _read_records(fp: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    return read_csv(fp) if fmt == "csv" else read_jsonl(fp)
+
+
+def export_all(db: Database, directory: str, fmt: str = "jsonl") -> Dict[str, int]:
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for table in TABLES:
+        with open(_table_path(directory, table, fmt), "w", encoding="utf-8", newline="") as fp:
+            counts[table] = export_table(db, table, fp, fmt)
+    return counts
+
+
+def import_all(db: Database, directory: str, fmt: str = "jsonl") -> Dict[str, ImportStats]:
+    # Все таблицы за один прогон с общим отображением id; отсутствующие файлы пропускаются
+    paths = {table: _table_path(directory, table, fmt) for table in TABLES}
+    if not os.path.exists(paths["quests"]):
+        raise FileNotFoundError(paths["quests"])
+    with_history = os.path.exists(paths["versions"])
+    id_map: Dict[int, int] = {}
+    result = {}
+    for table in TABLES:
+        if not os.path.exists(paths[table]):
+            continue
+        stats = ImportStats()
+        with open(paths[table], "r", encoding="utf-8", newline="") as fp:
+            import_table(db, table, _read_records(fp, fmt), id_map, stats, keyframes=not with_history)
+        result[table] = stats
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Потоковый импорт/экспорт квестов")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("table", choices=list(FIELDS) + ["all"],
+                        help="all — все таблицы; path тогда каталог с файлами <таблица>.<формат>")
+    parser.add_argument("path", help="файл JSONL или CSV (для all — каталог)")
+    parser.add_argument("--db", default=None, help="путь к quests.db")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--id-map", default=None,
+                        help="JSON со старыми и новыми id квестов: дополняется при импорте quests, "
+                             "читается при импорте versions и locations")
+    parser.add_argument("--no-keyframes", action="store_true",
+                        help="не создавать первую версию импортируемых квестов (история импортируется отдельно)")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    if args.action == "import" and args.table in ("versions", "locations") and not args.id_map:
+        parser.error(f"для импорта {args.table} нужен --id-map из импорта quests (или используйте all)")
+    if args.action == "import" and args.table in ("versions", "locations") and not os.path.exists(args.id_map):
+        parser.error(f"файл отображения не найден: {args.id_map}")
+
+    db = Database(args.db)
+    try:
+        if args.action == "export" and args.table == "all":
+            for table, count in export_all(db, args.path, fmt).items():
+                print(f"{table}: экспортировано записей: {count}")
+        elif args.action == "export":
+            with open(args.path, "w", encoding="utf-8", newline="") as fp:
+                count = export_table(db, args.table, fp, fmt)
+            print(f"Экспортировано записей: {count}")
+        elif args.table == "all":
+            for table, stats in import_all(db, args.path, fmt).items():
+                print(f"{table}: импортировано {stats.imported}, пропущено {stats.skipped}")
+        else:
+            # Отображение от прошлого (возможно, прерванного) импорта квестов дополняется,
+            # чтобы версии и локации уже записанных квестов не потеряли связь
+            id_map = read_id_map(args.id_map) if args.id_map and os.path.exists(args.id_map) else {}
+            on_chunk = (lambda m: write_id_map(m, args.id_map)) if args.table == "quests" and args.id_map else None
+            stats = ImportStats()
+            with open(args.path, "r", encoding="utf-8", newline="") as fp:
+                import_table(db, args.table, _read_records(fp, fmt), id_map, stats,
+                             keyframes=not args.no_keyframes, on_chunk=on_chunk)
+            skipped = "название уже есть" if args.table == "quests" else "нет квеста"
+            print(f"Импортировано записей: {stats.imported}, пропущено ({skipped}): {stats.skipped}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import sqlite3
+import struct
+import zlib
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+KEYFRAME_INTERVAL = 32
+COMPRESS_THRESHOLD = 256
+
+_HEADER = struct.Struct("<II")
+
+
+def _common_prefix(a: str, b: str, limit: int) -> int:
+    # Бинарный поиск по сравнению срезов — сравнение идёт в C, а не посимвольно
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def make_delta(old: str, new: str) -> bytes:
+    # Автосохранение почти всегда меняет один непрерывный кусок текста,
+    # поэтому дельта = общий префикс + общий суффикс + новая середина.
+    limit = min(len(old), len(new))
+    prefix = _common_prefix(old, new, limit)
+    suffix = _common_suffix(old, new, limit - prefix)
+    middle = new[prefix:len(new) - suffix].encode("utf-8")
+    if len(middle) >= COMPRESS_THRESHOLD:
+        packed = zlib.compress(middle)
+        if len(packed) < len(middle):
+            return b"z" + _HEADER.pack(prefix, suffix) + packed
+    return b"r" + _HEADER.pack(prefix, suffix) + middle
+
+
+def apply_delta(old: str, delta: bytes) -> str:
+    prefix, suffix = _HEADER.unpack_from(delta, 1)
+    middle = delta[1 + _HEADER.size:]
+    if delta[:1] == b"z":
+        middle = zlib.decompress(middle)
+    return old[:prefix] + middle.decode("utf-8") + old[len(old) - suffix:]
+
+
+class VersionStore:
+    # История квеста хранится цепочками: полный снимок описания (keyframe)
+    # раз в KEYFRAME_INTERVAL версий, между ними — дельты к предыдущей версии.
+    # Название, сложность и награда короткие и пишутся в каждую строку целиком.
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._heads: Dict[int, Tuple[int, int, str]] = {}
+
+    def reset(self, quest_id: Optional[int] = None) -> None:
+        if quest_id is None:
+            self._heads.clear()
+        else:
+            self._heads.pop(quest_id, None)
+
+    def insert(self, cur: sqlite3.Cursor, quest_id: int, title: str, difficulty: str,
+               reward: int, description: Optional[str], created_at: Optional[str]) -> int:
+        description = description or ""
+        head = self._head(cur, quest_id)
+        delta = None
+        if head is not None and head[1] + 1 < self.keyframe_interval:
+            delta = make_delta(head[2], description)
+            if len(delta) * 2 > len(description.encode("utf-8")):
+                delta = None
+
+        if delta is None:
+            cur.execute(
+                """
+                INSERT INTO quest_versions (quest_id, title, difficulty, reward, description,
+                                            created_at, kind, parent_id, delta, depth)
+                VALUES (?, ?, ?, ?, ?, ?, 'full', NULL, NULL, 0)
+                """,
+                (quest_id, title, difficulty, reward, description, created_at),
+            )
+            depth = 0
+        else:
+            depth = head[1] + 1
+            cur.execute(
+                """
+                INSERT INTO quest_versions (quest_id, title, difficulty, reward, description,
+                                            created_at, kind, parent_id, delta, depth)
+                VALUES (?, ?, ?, ?, NULL, ?, 'delta', ?, ?, ?)
+                """,
+                (quest_id, title, difficulty, reward, created_at, head[0], delta, depth),
+            )
+        version_id = cur.lastrowid
+        self._heads[quest_id] = (version_id, depth, description)
+        return version_id
+
+    def insert_keyframes(self, cur: sqlite3.Cursor,
+                         rows: Iterable[Tuple[int, str, str, int, Optional[str], str]]) -> None:
+        # Первая версия новых квестов: дельтировать не с чем, голов в кэше ещё нет
+        cur.executemany(
+            """
+            INSERT INTO quest_versions (quest_id, title, difficulty, reward, description,
+                                        created_at, kind, parent_id, delta, depth)
+            VALUES (?, ?, ?, ?, ?, ?, 'full', NULL, NULL, 0)
+            """,
+            rows,
+        )
+
+    def _head(self, cur: sqlite3.Cursor, quest_id: int) -> Optional[Tuple[int, int, str]]:
+        # Кэш головы сверяется с базой: историю мог переписать другой процесс
+        # (CLI ретенции), и дельта к удалённой версии потеряла бы текст.
+        # Поиск последнего id идёт по индексу (quest_id, id) и дешевле реконструкции.
+        cur.execute(
+            "SELECT id, depth FROM quest_versions WHERE quest_id = ? ORDER BY id DESC LIMIT 1",
+            (quest_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            self._heads.pop(quest_id, None)
+            return None
+        head = self._heads.get(quest_id)
+        if head is not None and head[0] == row[0]:
+            return head
+        head = (row[0], row[1] or 0, self.reconstruct(cur, row[0]) or "")
+        self._heads[quest_id] = head
+        return head
+
+    def reconstruct(self, cur: sqlite3.Cursor, version_id: int) -> Optional[str]:
+        cur.execute(
+            """
+            WITH RECURSIVE chain(id, parent_id, kind, description, delta, n) AS (
+                SELECT id, parent_id, kind, description, delta, 0
+                FROM quest_versions WHERE id = ?
+                UNION ALL
+                SELECT v.id, v.parent_id, v.kind, v.description, v.delta, c.n + 1
+                FROM quest_versions v JOIN chain c ON v.id = c.parent_id
+                WHERE c.kind = 'delta'
+            )
+            SELECT kind, description, delta FROM chain ORDER BY n DESC
+            """,
+            (version_id,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return None
+        text = rows[0][1] or ""
+        for _, _, delta in rows[1:]:
+            text = apply_delta(text, delta)
+        return text
+
+    def get_version(self, cur: sqlite3.Cursor, version_id: int) -> Optional[Dict[str, Any]]:
+        cur.execute(
+            "SELECT id, quest_id, title, difficulty, reward, created_at, kind FROM quest_versions WHERE id = ?",
+            (version_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        version = dict(row)
+        version["kind"] = version["kind"] or "full"
+        version["description"] = self.reconstruct(cur, version_id)
+        return version
+
+    def list_history(self, cur: sqlite3.Cursor, quest_id: int) -> List[Dict[str, Any]]:
+        cur.execute(
+            """
+            SELECT id, quest_id, title, difficulty, reward, created_at,
+                   COALESCE(kind, 'full') AS kind,
+                   COALESCE(LENGTH(delta), LENGTH(CAST(description AS BLOB)), 0) AS stored_bytes
+            FROM quest_versions
+            WHERE quest_id = ?
+            ORDER BY id ASC
+            """,
+            (quest_id,),
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+    def read_page(self, cur: sqlite3.Cursor, after: Tuple[int, int], limit: int,
+                  state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Потоковое чтение всей истории в порядке (quest_id, id). state хранит
+        # текст предыдущей версии, чтобы дельты применялись без повторных запросов.
+        cur.execute(
+            """
+            SELECT id, quest_id, title, difficulty, reward, description, created_at,
+                   kind, parent_id, delta
+            FROM quest_versions
+            WHERE (quest_id, id) > (?, ?)
+            ORDER BY quest_id, id
+            LIMIT ?
+            """,
+            (after[0], after[1], limit),
+        )
+        rows = cur.fetchall()
+        page = []
+        for row in rows:
+            if row["kind"] == "delta":
+                if state.get("id") == row["parent_id"]:
+                    text = apply_delta(state["text"], row["delta"])
+                else:
+                    text = self.reconstruct(cur, row["id"]) or ""
+            else:
+                text = row["description"] or ""
+            state["id"], state["text"] = row["id"], text
+            page.append({
+                "id": row["id"],
+                "quest_id": row["quest_id"],
+                "title": row["title"],
+                "difficulty": row["difficulty"],
+                "reward": row["reward"],
+                "description": text,
+                "created_at": row["created_at"],
+            })
+        return page
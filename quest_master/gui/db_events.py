@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from quest_master.core.database import Database, ChangeEvent
+
+
+class DatabaseEvents(QObject):
+    # Переносит уведомления Database в главный поток Qt: сигнал, испущенный
+    # из потока автосохранения, доставляется получателям через очередь событий.
+    changed = pyqtSignal(object)
+
+    def __init__(self, db: Database, parent=None):
+        super().__init__(parent)
+        self.db = db
+        db.subscribe(self._on_change)
+
+    def _on_change(self, event: ChangeEvent) -> None:
+        self.changed.emit(event)
+
+    def detach(self) -> None:
+        self.db.unsubscribe(self._on_change)
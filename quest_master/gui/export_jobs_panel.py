@@ -0,0 +1,121 @@
+from __future__ import annotations
+import os
+from typing import Dict
+
+from PyQt6.QtCore import QObject, pyqtSignal, Qt, QUrl
+from PyQt6.QtGui import QDesktopServices
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem,
+    QProgressBar, QHeaderView, QAbstractItemView
+)
+
+from quest_master.core.export_jobs import ExportQueue, ExportJob
+
+STATUS_TITLES = {
+    "queued": "В очереди",
+    "running": "Рендер…",
+    "done": "Готово",
+    "failed": "Ошибка",
+    "cancelled": "Отменено",
+}
+
+
+class ExportQueueEvents(QObject):
+    # Изменения задач приходят из потока очереди; сигнал доставляет их в главный поток
+    job_changed = pyqtSignal(object)
+
+    def __init__(self, queue: ExportQueue, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        queue.subscribe(self._on_job)
+
+    def _on_job(self, job: ExportJob) -> None:
+        self.job_changed.emit(job)
+
+    def detach(self) -> None:
+        self.queue.unsubscribe(self._on_job)
+
+
+class ExportJobsPanel(QWidget):
+    COLUMNS = ("№", "Квест", "Шаблон", "Формат", "Статус")
+
+    def __init__(self, queue: ExportQueue, events: ExportQueueEvents, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self._rows: Dict[int, ExportJob] = {}
+        self._titles: Dict[int, str] = {}
+
+        layout = QVBoxLayout()
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.cellDoubleClicked.connect(self._open_result)
+        layout.addWidget(self.table)
+
+        self.progress = QProgressBar()
+        self.progress.setFormat("%v из %m")
+        layout.addWidget(self.progress)
+
+        btn_layout = QHBoxLayout()
+        self.btn_cancel = QPushButton("Отменить")
+        self.btn_clear = QPushButton("Очистить завершённые")
+        btn_layout.addWidget(self.btn_cancel)
+        btn_layout.addWidget(self.btn_clear)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        self.btn_cancel.clicked.connect(self._cancel_selected)
+        self.btn_clear.clicked.connect(self._clear_finished)
+        events.job_changed.connect(self.update_job)
+        self.reload()
+
+    def reload(self) -> None:
+        self._rows = {job.id: job for job in self.queue.jobs()}
+        self._refresh()
+
+    def update_job(self, job: ExportJob) -> None:
+        self._rows[job.id] = job
+        self._refresh()
+
+    def _title(self, quest_id: int) -> str:
+        if quest_id not in self._titles:
+            quest = self.queue.db.get_quest(quest_id)
+            self._titles[quest_id] = quest["title"] if quest else f"#{quest_id}"
+        return self._titles[quest_id]
+
+    def _refresh(self) -> None:
+        jobs = sorted(self._rows.values(), key=lambda j: j.id, reverse=True)
+        self.table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            status = STATUS_TITLES.get(job.status, job.status)
+            values = (str(job.id), self._title(job.quest_id), job.template, job.format.upper(), status)
+            for col, text in enumerate(values):
+                item = QTableWidgetItem(text)
+                item.setData(Qt.ItemDataRole.UserRole, job.id)
+                if job.error:
+                    item.setToolTip(job.error)
+                elif job.status == "done":
+                    item.setToolTip(job.output_path)
+                self.table.setItem(row, col, item)
+        self.progress.setMaximum(max(len(jobs), 1))
+        self.progress.setValue(sum(1 for job in jobs if job.finished))
+
+    def _selected_ids(self):
+        return {item.data(Qt.ItemDataRole.UserRole) for item in self.table.selectedItems()}
+
+    def _cancel_selected(self) -> None:
+        for job_id in self._selected_ids():
+            self.queue.cancel(job_id)
+
+    def _clear_finished(self) -> None:
+        self.queue.clear_finished()
+        self.reload()
+
+    def _open_result(self, row: int, _column: int) -> None:
+        item = self.table.item(row, 0)
+        job = self._rows.get(item.data(Qt.ItemDataRole.UserRole)) if item else None
+        if job and job.status == "done" and os.path.exists(job.output_path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(job.output_path))
@@ -1,201 +1,546 @@
-from __future__ import annotations
-from typing import Optional
-
-from PyQt6.QtWidgets import (
-    QFileDialog, QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QGraphicsView, QGraphicsScene, QLabel, QSlider, QInputDialog
-)
-from PyQt6.QtGui import QImage, QPainter, QPen, QColor, QKeySequence, QBrush, QPixmap, QFont, QShortcut
-from PyQt6.QtCore import Qt, QPointF, QRectF
-
-from quest_master.core.database import Database
-from quest_master.core.gamification import Gamification
-
-
-class MapEditor(QWidget):
-    def __init__(self, db: Database, quest_id: int, gamification: Optional[Gamification] = None, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Редактор карты")
-        self.setMinimumSize(900, 700)
-
-        self.db = db
-        self.quest_id = quest_id
-        self.gamification = gamification
-
-        self.current_tool = "brush"
-        self.brush_size = 3
-        self.brush_color = QColor("brown")
-        self.items = []
-        self.last_point = None
-
-        self._build_ui()
-        self._reset_state()
-        self._create_shortcuts()
-        self._load_locations()
-
-    def _build_ui(self):
-        layout = QVBoxLayout()
-
-        toolbar = QHBoxLayout()
-        self.btn_brush = QPushButton("Кисть (пути)")
-        self.btn_brush.setCheckable(True)
-        self.btn_brush.setChecked(True)
-        toolbar.addWidget(self.btn_brush)
-
-        self.btn_city = QPushButton("Город (зелёный)")
-        self.btn_lair = QPushButton("Логово (красный)")
-        self.btn_tavern = QPushButton("Таверна (жёлтый)")
-        toolbar.addWidget(self.btn_city)
-        toolbar.addWidget(self.btn_lair)
-        toolbar.addWidget(self.btn_tavern)
-
-        self.btn_text = QPushButton("Текстовая метка")
-        toolbar.addWidget(self.btn_text)
-
-        self.btn_eraser = QPushButton("Ластик (undo)")
-        self.btn_eraser.setCheckable(True)
-        toolbar.addWidget(self.btn_eraser)
-
-        self.btn_load_bg = QPushButton("Загрузить фон")
-        toolbar.addWidget(self.btn_load_bg)
-
-        self.btn_save = QPushButton("Сохранить карту")
-        toolbar.addWidget(self.btn_save)
-
-        toolbar.addStretch()
-        toolbar.addWidget(QLabel("Размер:"))
-        self.size_slider = QSlider(Qt.Orientation.Horizontal)
-        self.size_slider.setRange(1, 40)
-        self.size_slider.setValue(3)
-        self.size_slider.setFixedWidth(150)
-        toolbar.addWidget(self.size_slider)
-
-        layout.addLayout(toolbar)
-
-
-        self.scene = QGraphicsScene()
-        self.scene.setSceneRect(0, 0, 800, 600)
-        self.scene.setBackgroundBrush(QBrush(QColor("#f4e4bc")))
-        self.view = GraphicsView(self.scene, self)
-        layout.addWidget(self.view)
-
-        self.setLayout(layout)
-
-
-        self.btn_brush.clicked.connect(lambda: self._select_tool("brush"))
-        self.btn_city.clicked.connect(lambda: self._select_tool("city"))
-        self.btn_lair.clicked.connect(lambda: self._select_tool("lair"))
-        self.btn_tavern.clicked.connect(lambda: self._select_tool("tavern"))
-        self.btn_text.clicked.connect(lambda: self._select_tool("text"))
-        self.btn_eraser.clicked.connect(lambda: self._select_tool("eraser"))
-        self.size_slider.valueChanged.connect(self._change_brush_size)
-        self.btn_save.clicked.connect(self._save_canvas)
-        self.btn_load_bg.clicked.connect(self._load_background)
-
-    def _reset_state(self):
-
-        self.last_point = None
-
-    def _create_shortcuts(self):
-
-        undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
-        undo_shortcut.activated.connect(self._undo)
-        
-        save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
-        save_shortcut.activated.connect(self._save_canvas)
-
-    def _select_tool(self, tool: str):
-        self.current_tool = tool
-        self.btn_brush.setChecked(tool == "brush")
-        self.btn_eraser.setChecked(tool == "eraser")
-
-    def _change_brush_size(self, value):
-        self.brush_size = value
-
-    def _add_marker(self, pos: QPointF, type_: str):
-        colors = {"city": "green", "lair": "red", "tavern": "yellow"}
-        color = QColor(colors[type_])
-        ellipse = self.scene.addEllipse(pos.x() - 10, pos.y() - 10, 20, 20, QPen(color), QBrush(color))
-        self.items.append(ellipse)
-        self.db.add_location(self.quest_id, pos.x(), pos.y(), type_)
-
-    def _add_text(self, pos: QPointF):
-        text, ok = QInputDialog.getText(self, "Метка", "Введите текст:")
-        if ok and text:
-            item = self.scene.addText(text, QFont("Uncial Antiqua", 10))
-            item.setPos(pos)
-            item.setDefaultTextColor(QColor("black"))
-            self.items.append(item)
-
-    def _undo(self):
-        if self.items:
-            last_item = self.items.pop()
-            self.scene.removeItem(last_item)
-            self.db.delete_last_location(self.quest_id)
-
-    def _load_background(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Загрузить фон", "", "Images (*.png *.jpg)")
-        if path:
-            pixmap = QPixmap(path)
-            self.scene.addPixmap(pixmap.scaled(800, 600))
-
-    def _load_locations(self):
-        locations = self.db.get_locations(self.quest_id)
-        for loc in locations:
-            if len(loc) >= 4:
-                _, x, y, type_ = loc[:4]
-                self._add_marker(QPointF(x, y), type_)
-
-    def _save_canvas(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Сохранить карту", "map.png", "PNG (*.png);;JPEG (*.jpg *.jpeg)")
-        if not path:
-            return
-        rect = self.scene.sceneRect()
-        image = QImage(int(rect.width()), int(rect.height()), QImage.Format.Format_ARGB32)
-        painter = QPainter(image)
-        self.scene.render(painter)
-        painter.end()
-        if image.save(path):
-            QMessageBox.information(self, "Готово", f"Карта сохранена:\n{path}")
-            if self.gamification:
-                self.gamification.award_xp(5, "Сохранение карты")
-        else:
-            QMessageBox.critical(self, "Ошибка", "Не удалось сохранить.")
-
-
-class GraphicsView(QGraphicsView):
-    def __init__(self, scene: QGraphicsScene, editor: MapEditor, parent=None):
-        super().__init__(scene, parent)
-        self.editor = editor
-        self.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-    def mousePressEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton:
-            pos = self.mapToScene(event.pos())
-            if self.editor.current_tool == "brush":
-                self.editor.last_point = pos
-            elif self.editor.current_tool in ["city", "lair", "tavern"]:
-                self.editor._add_marker(pos, self.editor.current_tool)
-            elif self.editor.current_tool == "text":
-                self.editor._add_text(pos)
-            elif self.editor.current_tool == "eraser":
-                self.editor._undo()
-        super().mousePressEvent(event)
-
-    def mouseMoveEvent(self, event):
-        if event.buttons() & Qt.MouseButton.LeftButton and self.editor.current_tool == "brush":
-            if self.editor.last_point:
-                pos = self.mapToScene(event.pos())
-                pen = QPen(self.editor.brush_color, self.editor.brush_size, Qt.PenStyle.SolidLine, Qt.PenCapStyle.RoundCap)
-                line = self.editor.scene.addLine(
-                    self.editor.last_point.x(), self.editor.last_point.y(),
-                    pos.x(), pos.y(), pen
-                )
-                self.editor.items.append(line)
-                self.editor.last_point = pos
-        super().mouseMoveEvent(event)
-
-    def mouseReleaseEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.editor.last_point = None
-        super().mouseReleaseEvent(event)
+from __future__ import annotations
+import math
+import weakref
+from typing import Optional, List, Tuple, Dict
+
+from PyQt6.QtWidgets import (
+    QFileDialog, QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+    QGraphicsView, QGraphicsScene, QLabel, QSlider, QInputDialog, QGraphicsPathItem, QGraphicsTextItem,
+    QGraphicsEllipseItem
+)
+from PyQt6.QtGui import (
+    QImage, QPainter, QPen, QColor, QKeySequence, QBrush, QFont, QShortcut, QPainterPath,
+    QUndoStack, QUndoCommand
+)
+from PyQt6.QtCore import Qt, QPointF, QRectF, QTimer
+
+from quest_master.core.database import Database
+from quest_master.core.gamification import Gamification
+from quest_master.core.geometry import simplify_rdp
+from quest_master.core.map_layers import MapLayers, Stroke, MapLabel, Rect
+from quest_master.gui.tile_layer import PyramidLoader, TileLayer
+
+# Точки ближе этого шага к предыдущей не добавляются в штрих (в единицах сцены)
+STROKE_MIN_STEP = 1.0
+# Допуск упрощения штриха после отпускания кнопки
+STROKE_EPSILON = 0.75
+# Накопленные правки пишутся в базу после паузы в редактировании (мс)
+FLUSH_IDLE_MS = 2000
+MARKER_COLORS = {"city": "green", "lair": "red", "tavern": "yellow"}
+MARKER_RADIUS = 10
+# В сцене живут только маркеры видимой области плюс запас (доля размера окна с каждой стороны)
+VIEWPORT_MARGIN = 0.5
+VIEWPORT_REFRESH_MS = 30
+MAX_VISIBLE_MARKERS = 5000
+ZOOM_STEP = 1.15
+ZOOM_MIN, ZOOM_MAX = 0.02, 8.0
+# Сторона PNG при экспорте большой карты ограничена, фон берётся с подходящего уровня пирамиды
+EXPORT_MAX_SIDE = 8192
+
+
+class StrokeItem(QGraphicsPathItem):
+    # Один штрих кисти — один элемент сцены: точки копятся в QPainterPath,
+    # а не превращаются в отдельную линию на каждое движение мыши
+    def __init__(self, points: List[Tuple[float, float]], pen: QPen):
+        super().__init__()
+        self.points = list(points)
+        self.setPen(pen)
+        self._rebuild()
+
+    def add_point(self, x: float, y: float) -> None:
+        self.points.append((x, y))
+        path = self.path()
+        path.lineTo(x, y)
+        self.setPath(path)
+
+    def simplify(self, epsilon: float) -> None:
+        self.points = simplify_rdp(self.points, epsilon)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        path = QPainterPath()
+        if self.points:
+            path.moveTo(*self.points[0])
+            for x, y in self.points[1:]:
+                path.lineTo(x, y)
+        self.setPath(path)
+
+
+class MarkerItem(QGraphicsEllipseItem):
+    # location_id — строка quest_locations; None, пока маркер не записан в базу
+    def __init__(self, x: float, y: float, type_: str, location_id: Optional[int] = None):
+        r = MARKER_RADIUS
+        super().__init__(x - r, y - r, 2 * r, 2 * r)
+        self.x_, self.y_ = x, y
+        self.type_ = type_
+        self.location_id = location_id
+        color = QColor(MARKER_COLORS[type_])
+        self.setPen(QPen(color))
+        self.setBrush(QBrush(color))
+
+
+class AddItemCommand(QUndoCommand):
+    # redo кладёт элемент на сцену, undo убирает его; база обновляется позже пачкой
+    def __init__(self, editor: "MapEditor", item, text: str):
+        super().__init__(text)
+        self.editor = editor
+        self.item = item
+
+    def redo(self):
+        self.editor._attach(self.item)
+
+    def undo(self):
+        self.editor._detach(self.item)
+
+
+class MapEditor(QWidget):
+    def __init__(self, db: Database, quest_id: int, gamification: Optional[Gamification] = None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Редактор карты")
+        self.setMinimumSize(900, 700)
+
+        self.db = db
+        self.quest_id = quest_id
+        self.gamification = gamification
+
+        self.current_tool = "brush"
+        self.brush_size = 3
+        self.brush_color = QColor("brown")
+        self.current_stroke: Optional[StrokeItem] = None
+        self.background_tiles: Optional[TileLayer] = None
+        self.background_path: Optional[str] = None
+        self.background_rect: Optional[Rect] = None
+        self._background_request: Optional[str] = None
+        self._background_request_rect: Optional[Rect] = None
+        self._background_by_user = False
+        self.tile_loader = PyramidLoader(self)
+        self.tile_loader.ready.connect(self._on_background_ready)
+        self.tile_loader.failed.connect(self._on_background_failed)
+        self.tile_loader.progress.connect(self._on_background_progress)
+
+        self.undo_stack = QUndoStack(self)
+        self._pending_markers: Dict[int, MarkerItem] = {}
+        self._pending_deletes: Dict[int, MarkerItem] = {}
+        self._layers_dirty = False
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(FLUSH_IDLE_MS)
+        self._flush_timer.timeout.connect(self.flush_changes)
+
+        # Маркеры из базы по location_id: _shown — сейчас в сцене, _markers — все живые
+        # (в том числе удерживаемые командами отмены), чтобы не плодить дубликаты
+        self._shown: Dict[int, MarkerItem] = {}
+        self._markers: "weakref.WeakValueDictionary[int, MarkerItem]" = weakref.WeakValueDictionary()
+        self._loaded_rect = QRectF()
+        self._cull_timer = QTimer(self)
+        self._cull_timer.setSingleShot(True)
+        self._cull_timer.setInterval(VIEWPORT_REFRESH_MS)
+        self._cull_timer.timeout.connect(self._refresh_viewport)
+
+        self._build_ui()
+        self._reset_state()
+        self._create_shortcuts()
+        self._load_layers()
+        self._fit_scene_to_content()
+        self._cull_timer.start()
+
+    def _build_ui(self):
+        layout = QVBoxLayout()
+
+        toolbar = QHBoxLayout()
+        self.btn_brush = QPushButton("Кисть (пути)")
+        self.btn_brush.setCheckable(True)
+        self.btn_brush.setChecked(True)
+        toolbar.addWidget(self.btn_brush)
+
+        self.btn_city = QPushButton("Город (зелёный)")
+        self.btn_lair = QPushButton("Логово (красный)")
+        self.btn_tavern = QPushButton("Таверна (жёлтый)")
+        toolbar.addWidget(self.btn_city)
+        toolbar.addWidget(self.btn_lair)
+        toolbar.addWidget(self.btn_tavern)
+
+        self.btn_text = QPushButton("Текстовая метка")
+        toolbar.addWidget(self.btn_text)
+
+        self.btn_eraser = QPushButton("Ластик (undo)")
+        self.btn_eraser.setCheckable(True)
+        toolbar.addWidget(self.btn_eraser)
+
+        self.btn_load_bg = QPushButton("Загрузить фон")
+        toolbar.addWidget(self.btn_load_bg)
+
+        self.btn_save = QPushButton("Сохранить карту")
+        toolbar.addWidget(self.btn_save)
+
+        self.background_status = QLabel("")
+        toolbar.addWidget(self.background_status)
+
+        toolbar.addStretch()
+        toolbar.addWidget(QLabel("Размер:"))
+        self.size_slider = QSlider(Qt.Orientation.Horizontal)
+        self.size_slider.setRange(1, 40)
+        self.size_slider.setValue(3)
+        self.size_slider.setFixedWidth(150)
+        toolbar.addWidget(self.size_slider)
+
+        layout.addLayout(toolbar)
+
+
+        self.scene = QGraphicsScene()
+        self.scene.setSceneRect(0, 0, 800, 600)
+        self.scene.setBackgroundBrush(QBrush(QColor("#f4e4bc")))
+        self.view = GraphicsView(self.scene, self)
+        self.view.horizontalScrollBar().valueChanged.connect(self._schedule_cull)
+        self.view.verticalScrollBar().valueChanged.connect(self._schedule_cull)
+        layout.addWidget(self.view)
+
+        self.setLayout(layout)
+
+
+        self.btn_brush.clicked.connect(lambda: self._select_tool("brush"))
+        self.btn_city.clicked.connect(lambda: self._select_tool("city"))
+        self.btn_lair.clicked.connect(lambda: self._select_tool("lair"))
+        self.btn_tavern.clicked.connect(lambda: self._select_tool("tavern"))
+        self.btn_text.clicked.connect(lambda: self._select_tool("text"))
+        self.btn_eraser.clicked.connect(lambda: self._select_tool("eraser"))
+        self.size_slider.valueChanged.connect(self._change_brush_size)
+        self.btn_save.clicked.connect(self._save_canvas)
+        self.btn_load_bg.clicked.connect(self._load_background)
+
+    def _reset_state(self):
+
+        self.current_stroke = None
+
+    def _create_shortcuts(self):
+
+        undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
+        undo_shortcut.activated.connect(self._undo)
+
+        for keys in ("Ctrl+Y", "Ctrl+Shift+Z"):
+            redo_shortcut = QShortcut(QKeySequence(keys), self)
+            redo_shortcut.activated.connect(self._redo)
+
+        save_shortcut = QShortcut(QKeySequence("Ctrl+S"), self)
+        save_shortcut.activated.connect(self._save_canvas)
+
+    def _select_tool(self, tool: str):
+        self.current_tool = tool
+        self.btn_brush.setChecked(tool == "brush")
+        self.btn_eraser.setChecked(tool == "eraser")
+
+    def _change_brush_size(self, value):
+        self.brush_size = value
+
+    def _begin_stroke(self, pos: QPointF):
+        pen = QPen(self.brush_color, self.brush_size, Qt.PenStyle.SolidLine,
+                   Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin)
+        self.current_stroke = StrokeItem([(pos.x(), pos.y())], pen)
+        self.scene.addItem(self.current_stroke)
+
+    def _extend_stroke(self, pos: QPointF):
+        stroke = self.current_stroke
+        if stroke is None:
+            return
+        last_x, last_y = stroke.points[-1]
+        if math.hypot(pos.x() - last_x, pos.y() - last_y) < STROKE_MIN_STEP:
+            return
+        stroke.add_point(pos.x(), pos.y())
+
+    def _end_stroke(self):
+        stroke = self.current_stroke
+        self.current_stroke = None
+        if stroke is None:
+            return
+        if len(stroke.points) < 2:
+            self.scene.removeItem(stroke)
+            return
+        stroke.simplify(STROKE_EPSILON)
+        self.undo_stack.push(AddItemCommand(self, stroke, "Штрих"))
+
+    def _add_marker(self, pos: QPointF, type_: str):
+        self.undo_stack.push(AddItemCommand(self, MarkerItem(pos.x(), pos.y(), type_), "Маркер"))
+
+    def _add_text(self, pos: QPointF):
+        text, ok = QInputDialog.getText(self, "Метка", "Введите текст:")
+        if ok and text:
+            self.undo_stack.push(AddItemCommand(self, self._label_item(MapLabel(pos.x(), pos.y(), text)), "Метка"))
+
+    @staticmethod
+    def _label_item(label: MapLabel) -> QGraphicsTextItem:
+        item = QGraphicsTextItem(label.text)
+        item.setFont(QFont("Uncial Antiqua", label.font_size))
+        item.setPos(label.x, label.y)
+        item.setDefaultTextColor(QColor.fromRgba(label.color))
+        return item
+
+    def _attach(self, item):
+        if item.scene() is None:
+            self.scene.addItem(item)
+        if isinstance(item, MarkerItem):
+            if item.location_id is None:
+                self._pending_markers[id(item)] = item
+            else:
+                self._pending_deletes.pop(item.location_id, None)
+                self._shown[item.location_id] = item
+        else:
+            self._layers_dirty = True
+        self._flush_timer.start()
+
+    def _detach(self, item):
+        if item.scene() is not None:
+            self.scene.removeItem(item)
+        if isinstance(item, MarkerItem):
+            if item.location_id is None:
+                self._pending_markers.pop(id(item), None)
+            else:
+                self._pending_deletes[item.location_id] = item
+                self._shown.pop(item.location_id, None)
+        else:
+            self._layers_dirty = True
+        self._flush_timer.start()
+
+    def _undo(self):
+        self.undo_stack.undo()
+
+    def _redo(self):
+        self.undo_stack.redo()
+
+    def flush_changes(self):
+        # Маркеры — одной транзакцией в quest_locations, штрихи и метки — строкой quest_maps
+        self._flush_timer.stop()
+        if self._pending_markers or self._pending_deletes:
+            markers = list(self._pending_markers.values())
+            ids = self.db.apply_location_changes(
+                self.quest_id, [(m.x_, m.y_, m.type_, None) for m in markers], list(self._pending_deletes)
+            )
+            for marker, location_id in zip(markers, ids):
+                marker.location_id = location_id
+                self._markers[location_id] = marker
+                if marker.scene() is not None:
+                    self._shown[location_id] = marker
+            # Удалённая строка при redo вставится заново
+            for location_id, marker in self._pending_deletes.items():
+                self._markers.pop(location_id, None)
+                marker.location_id = None
+            self._pending_markers.clear()
+            self._pending_deletes.clear()
+        if self._layers_dirty:
+            self.save_layers()
+
+    def _load_background(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Загрузить фон", "", "Images (*.png *.jpg *.jpeg)")
+        if path:
+            self._set_background(path, by_user=True)
+
+    def _set_background(self, path: str, by_user: bool = False, rect: Optional[Rect] = None):
+        # Пирамида тайлов строится в фоне (или берётся из кэша); до готовности остаётся прежний фон.
+        # rect — сохранённое место фона в сцене; новый фон ложится пиксель в единицу сцены
+        self._background_request = path
+        self._background_request_rect = rect
+        self._background_by_user = by_user
+        self.background_status.setText("Фон: подготовка…")
+        self.background_status.setToolTip("")
+        self.tile_loader.load(path)
+
+    def _on_background_progress(self, path: str, done: int, total: int):
+        if path == self._background_request:
+            self.background_status.setText(f"Фон: {done * 100 // max(total, 1)}%")
+
+    def _on_background_ready(self, path: str, pyramid):
+        if path != self._background_request:
+            return
+        self._background_request = None
+        if self.background_tiles is not None:
+            self.background_tiles.clear()
+        rect = self._background_request_rect
+        self.background_tiles = TileLayer(self.scene, pyramid, QRectF(*rect) if rect is not None else None)
+        tiles_rect = self.background_tiles.rect
+        self.scene.setSceneRect(self.scene.sceneRect().united(tiles_rect))
+        self.background_path = path
+        self.background_rect = (tiles_rect.x(), tiles_rect.y(), tiles_rect.width(), tiles_rect.height())
+        self.background_status.setText("")
+        if self._background_by_user:
+            self._layers_dirty = True
+            self._flush_timer.start()
+        self._refresh_viewport()
+
+    def _on_background_failed(self, path: str, error: str):
+        if path != self._background_request:
+            return
+        self._background_request = None
+        self.background_status.setText("Фон не загружен")
+        self.background_status.setToolTip(error)
+        if self._background_by_user:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить фон:\n{error}")
+
+    def _schedule_cull(self, *_):
+        self._cull_timer.start()
+
+    def _refresh_viewport(self):
+        if self.background_tiles is not None:
+            visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+            self.background_tiles.update(visible, self.view.transform().m11())
+        self._refresh_markers()
+
+    def _fit_scene_to_content(self):
+        # Холст растёт под содержимое: точки из базы, штрихи и метки
+        rect = self.scene.sceneRect().united(self.scene.itemsBoundingRect())
+        bounds = self.db.location_bounds(self.quest_id)
+        if bounds is not None:
+            x0, y0, x1, y1 = bounds
+            r = MARKER_RADIUS
+            rect = rect.united(QRectF(x0 - r, y0 - r, x1 - x0 + 2 * r, y1 - y0 + 2 * r))
+        self.scene.setSceneRect(rect)
+
+    def _refresh_markers(self, rect: Optional[QRectF] = None):
+        # Запрос к R-tree только когда видимая область вышла за уже загруженную
+        if rect is None:
+            visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+            if not self._loaded_rect.isEmpty() and self._loaded_rect.contains(visible):
+                return
+            dx, dy = visible.width() * VIEWPORT_MARGIN, visible.height() * VIEWPORT_MARGIN
+            rect = visible.adjusted(-dx, -dy, dx, dy)
+        rows = self.db.get_locations_in_rect(self.quest_id, rect.left(), rect.top(), rect.right(), rect.bottom(),
+                                             MAX_VISIBLE_MARKERS)
+        wanted = {}
+        for location_id, x, y, type_, _label in rows:
+            if location_id not in self._pending_deletes and type_ in MARKER_COLORS:
+                wanted[location_id] = (x, y, type_)
+        for location_id in [i for i in self._shown if i not in wanted]:
+            item = self._shown.pop(location_id)
+            if item.scene() is not None:
+                self.scene.removeItem(item)
+        for location_id, (x, y, type_) in wanted.items():
+            if location_id in self._shown:
+                continue
+            item = self._markers.get(location_id)
+            if item is None:
+                item = MarkerItem(x, y, type_, location_id)
+                self._markers[location_id] = item
+            if item.scene() is None:
+                self.scene.addItem(item)
+            self._shown[location_id] = item
+        # Упёрлись в лимит — область загружена не целиком, при следующем сдвиге запросим снова
+        self._loaded_rect = QRectF() if len(rows) >= MAX_VISIBLE_MARKERS else rect
+
+    def _load_layers(self):
+        layers = self.db.load_map_layers(self.quest_id)
+        if layers.background:
+            # Сохранённый фон остаётся в карте, даже если файл сейчас не открылся
+            self.background_path, self.background_rect = layers.background, layers.background_rect
+            self._set_background(layers.background, rect=layers.background_rect)
+        for stroke in layers.strokes:
+            pen = QPen(QColor.fromRgba(stroke.color), stroke.width, Qt.PenStyle.SolidLine,
+                       Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin)
+            self.scene.addItem(StrokeItem(stroke.points, pen))
+        for label in layers.labels:
+            self.scene.addItem(self._label_item(label))
+
+    def save_layers(self):
+        layers = MapLayers(background=self.background_path, background_rect=self.background_rect)
+        for item in self.scene.items(Qt.SortOrder.AscendingOrder):
+            if item is self.current_stroke:
+                continue
+            if isinstance(item, StrokeItem):
+                pen = item.pen()
+                layers.strokes.append(Stroke(item.points, pen.widthF(), pen.color().rgba()))
+            elif isinstance(item, QGraphicsTextItem):
+                layers.labels.append(MapLabel(item.pos().x(), item.pos().y(), item.toPlainText(),
+                                              item.font().pointSize(), item.defaultTextColor().rgba()))
+        self.db.save_map_layers(self.quest_id, layers)
+        self._layers_dirty = False
+
+    def closeEvent(self, event):
+        self.flush_changes()
+        super().closeEvent(event)
+
+    def _save_canvas(self):
+        self._layers_dirty = True
+        self.flush_changes()
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить карту", "map.png", "PNG (*.png);;JPEG (*.jpg *.jpeg)")
+        if not path:
+            return
+        rect = self.scene.sceneRect()
+        scale = min(1.0, EXPORT_MAX_SIDE / max(rect.width(), rect.height()))
+        if self.background_tiles is not None:
+            self.background_tiles.update(rect, scale)
+        image = QImage(int(rect.width() * scale), int(rect.height() * scale), QImage.Format.Format_ARGB32)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        # В сцене только маркеры окна просмотра (и не больше MAX_VISIBLE_MARKERS), поэтому
+        # на экспорт они рисуются напрямую из базы страницами — правки уже сброшены выше
+        shown = [item for item in self._shown.values() if item.isVisible()]
+        for item in shown:
+            item.setVisible(False)
+        try:
+            self.scene.render(painter, QRectF(image.rect()), rect)
+        finally:
+            for item in shown:
+                item.setVisible(True)
+        painter.scale(scale, scale)
+        painter.translate(-rect.left(), -rect.top())
+        r = MARKER_RADIUS
+        for _, x, y, type_, _label in self.db.iter_locations_in_rect(
+                self.quest_id, rect.left() - r, rect.top() - r, rect.right() + r, rect.bottom() + r):
+            if type_ in MARKER_COLORS:
+                color = QColor(MARKER_COLORS[type_])
+                painter.setPen(QPen(color))
+                painter.setBrush(QBrush(color))
+                painter.drawEllipse(QPointF(x, y), r, r)
+        painter.end()
+        # Вернуть в сцену только видимые тайлы
+        self._schedule_cull()
+        if image.save(path):
+            QMessageBox.information(self, "Готово", f"Карта сохранена:\n{path}")
+            if self.gamification:
+                self.gamification.award_xp(5, "Сохранение карты")
+        else:
+            QMessageBox.critical(self, "Ошибка", "Не удалось сохранить.")
+
+
+class GraphicsView(QGraphicsView):
+    def __init__(self, scene: QGraphicsScene, editor: MapEditor, parent=None):
+        super().__init__(scene, parent)
+        self.editor = editor
+        self.setRenderHint(QPainter.RenderHint.Antialiasing)
+        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+
+    def wheelEvent(self, event):
+        # Ctrl + колесо — масштаб, без Ctrl — обычная прокрутка
+        if not event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            super().wheelEvent(event)
+            return
+        factor = ZOOM_STEP ** (event.angleDelta().y() / 120)
+        scale = self.transform().m11() * factor
+        if ZOOM_MIN <= scale <= ZOOM_MAX:
+            self.scale(factor, factor)
+            self.editor._schedule_cull()
+        event.accept()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.editor._schedule_cull()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            pos = self.mapToScene(event.pos())
+            if self.editor.current_tool == "brush":
+                self.editor._begin_stroke(pos)
+            elif self.editor.current_tool in ["city", "lair", "tavern"]:
+                self.editor._add_marker(pos, self.editor.current_tool)
+            elif self.editor.current_tool == "text":
+                self.editor._add_text(pos)
+            elif self.editor.current_tool == "eraser":
+                self.editor._undo()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.MouseButton.LeftButton and self.editor.current_tool == "brush":
+            self.editor._extend_stroke(self.mapToScene(event.pos()))
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.editor._end_stroke()
+        super().mouseReleaseEvent(event)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import bisect
+from typing import Optional, Dict, Any, List, Tuple
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from quest_master.core.database import Database, ChangeEvent
+
+PAGE_SIZE = 200
+SEARCH_MARK = ("«", "»")
+
+
+class QuestListModel(QAbstractListModel):
+    QuestIdRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, db: Database, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self._rows: List[Dict[str, Any]] = []
+        self._exhausted = False
+        self.query = ""
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        quest = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            title = quest.get("title_hl") or quest["title"]
+            return f"{title} (ID: {quest['id']}, Сложность: {quest['difficulty']})"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return quest.get("snippet")
+        if role == self.QuestIdRole:
+            return quest["id"]
+        return None
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid() or self._exhausted:
+            return
+        if self.query:
+            page = self.db.search_quests(self.query, limit=self.page_size, offset=len(self._rows),
+                                         mark=SEARCH_MARK)
+        else:
+            after = None
+            if self._rows:
+                last = self._rows[-1]
+                after = (last["created_at"], last["id"])
+            page = self.db.list_quests(after=after, limit=self.page_size)
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def reload(self) -> None:
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_query(self, query: str) -> None:
+        query = query.strip()
+        if query == self.query:
+            return
+        self.query = query
+        self.reload()
+
+    def apply_change(self, event: ChangeEvent) -> None:
+        if self.query:
+            self._apply_search_change(event)
+            return
+        if event.deleted:
+            self._remove_rows(set(event.deleted))
+        if event.updated:
+            self._update_rows(set(event.updated))
+        if event.created:
+            self._insert_rows(event.created)
+
+    def _apply_search_change(self, event: ChangeEvent) -> None:
+        # Поиск повторяется только по изменённым квестам: показанные обновляются на месте
+        # (ранг не пересчитывается), переставшие подходить убираются. Полная перезагрузка —
+        # только когда квест стал подходить под запрос: его место знает лишь новый поиск.
+        if event.deleted:
+            self._remove_rows(set(event.deleted))
+        changed = set(event.updated) | set(event.created)
+        if not changed:
+            return
+        matches = {q["id"]: q for q in self.db.search_quests(self.query, limit=len(changed), mark=SEARCH_MARK,
+                                                             ids=sorted(changed))}
+        shown = {q["id"] for q in self._rows}
+        if set(matches) - shown:
+            self.reload()
+            return
+        self._remove_rows((changed & shown) - set(matches))
+        for row in self._rows_for(set(matches)):
+            self._rows[row] = matches[self._rows[row]["id"]]
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    @staticmethod
+    def _sort_key(quest: Dict[str, Any]) -> Tuple[str, int]:
+        return (quest["created_at"] or "", quest["id"])
+
+    def _rows_for(self, quest_ids: set) -> List[int]:
+        return [i for i, quest in enumerate(self._rows) if quest["id"] in quest_ids]
+
+    def _remove_rows(self, quest_ids: set) -> None:
+        for row in reversed(self._rows_for(quest_ids)):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+
+    def _update_rows(self, quest_ids: set) -> None:
+        rows = self._rows_for(quest_ids)
+        if not rows:
+            return
+        fresh = {q["id"]: q for q in self.db.get_quest_summaries([self._rows[r]["id"] for r in rows])}
+        for row in rows:
+            quest = fresh.get(self._rows[row]["id"])
+            if quest is None:
+                continue
+            self._rows[row] = quest
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def _insert_rows(self, quest_ids: Tuple[int, ...]) -> None:
+        known = {q["id"] for q in self._rows}
+        new = self.db.get_quest_summaries([i for i in quest_ids if i not in known])
+        # Строки отсортированы по убыванию ключа; ищем позицию по инвертированному списку
+        keys = [self._sort_key(q) for q in reversed(self._rows)]
+        for quest in sorted(new, key=self._sort_key):
+            pos = len(self._rows) - bisect.bisect_right(keys, self._sort_key(quest))
+            if pos == len(self._rows) and not self._exhausted and self._rows:
+                # Строка старше загруженного окна — её принесёт следующий fetchMore
+                continue
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self._rows.insert(pos, quest)
+            self.endInsertRows()
+            bisect.insort_right(keys, self._sort_key(quest))
+
+    def quest_id(self, index: QModelIndex) -> Optional[int]:
+        if not index.isValid():
+            return None
+        return self.data(index, self.QuestIdRole)
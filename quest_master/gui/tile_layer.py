@@ -0,0 +1,94 @@
+from __future__ import annotations
+import threading
+from typing import Dict, Optional, Tuple
+
+from PyQt6.QtCore import QObject, pyqtSignal, QRectF, Qt
+from PyQt6.QtGui import QPixmap, QTransform
+from PyQt6.QtWidgets import QGraphicsScene, QGraphicsPixmapItem
+
+from quest_master.core.map_tiles import TilePyramid, build_pyramid
+
+TileKey = Tuple[int, int, int]
+# Прогресс нарезки шлётся не на каждый тайл, чтобы не забивать очередь событий
+PROGRESS_EVERY = 64
+
+
+class PyramidLoader(QObject):
+    # Декодирование и нарезка фона идут в фоновом потоке; результат приходит сигналом в главный поток
+    ready = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+    progress = pyqtSignal(str, int, int)
+
+    def load(self, path: str) -> None:
+        threading.Thread(target=self._run, args=(path,), name="map-tiles", daemon=True).start()
+
+    def _run(self, path: str) -> None:
+        try:
+            pyramid = build_pyramid(path, progress=lambda done, total: self._report(path, done, total))
+        except Exception as e:
+            self._emit(self.failed, path, f"{type(e).__name__}: {e}")
+        else:
+            self._emit(self.ready, path, pyramid)
+
+    def _report(self, path: str, done: int, total: int) -> None:
+        if done == total or done % PROGRESS_EVERY == 0:
+            self._emit(self.progress, path, done, total)
+
+    @staticmethod
+    def _emit(signal, *args) -> None:
+        try:
+            signal.emit(*args)
+        except RuntimeError:
+            # Редактор закрыли, пока строилась пирамида
+            pass
+
+
+class TileLayer:
+    # В сцене лежат только тайлы, попадающие в видимую область на уровне под текущий масштаб.
+    # Изображение растягивается на rect в координатах сцены; без rect — пиксель на единицу сцены.
+    def __init__(self, scene: QGraphicsScene, pyramid: TilePyramid, rect: Optional[QRectF] = None,
+                 z: float = -1):
+        self.scene = scene
+        self.pyramid = pyramid
+        self.rect = QRectF(rect) if rect is not None else QRectF(0, 0, pyramid.width, pyramid.height)
+        self.sx = self.rect.width() / pyramid.width
+        self.sy = self.rect.height() / pyramid.height
+        self.z = z
+        self.items: Dict[TileKey, QGraphicsPixmapItem] = {}
+
+    def update(self, visible: QRectF, scale: float) -> None:
+        pyramid = self.pyramid
+        # Пикселей экрана на пиксель изображения — по более растянутой оси, чтобы не мылить
+        level = pyramid.level_for_scale(scale * max(self.sx, self.sy))
+        # Видимая область в пикселях изображения плюс запас в тайл, чтобы край не мелькал пустым
+        margin = pyramid.tile_size << level
+        x0 = (visible.left() - self.rect.left()) / self.sx - margin
+        y0 = (visible.top() - self.rect.top()) / self.sy - margin
+        x1 = (visible.right() - self.rect.left()) / self.sx + margin
+        y1 = (visible.bottom() - self.rect.top()) / self.sy + margin
+        wanted = {(level, col, row)
+                  for col, row in pyramid.tiles_in_rect(level, x0, y0, x1, y1)}
+        for key in [k for k in self.items if k not in wanted]:
+            self.scene.removeItem(self.items.pop(key))
+        for key in wanted - self.items.keys():
+            item = self._tile_item(*key)
+            if item is not None:
+                self.items[key] = item
+
+    def _tile_item(self, level: int, col: int, row: int) -> Optional[QGraphicsPixmapItem]:
+        pixmap = QPixmap(self.pyramid.tile_path(level, col, row))
+        if pixmap.isNull():
+            return None
+        factor = 1 << level
+        span = self.pyramid.tile_size * factor
+        item = self.scene.addPixmap(pixmap)
+        item.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+        item.setTransform(QTransform.fromScale(factor * self.sx, factor * self.sy))
+        item.setPos(self.rect.left() + col * span * self.sx, self.rect.top() + row * span * self.sy)
+        item.setZValue(self.z)
+        return item
+
+    def clear(self) -> None:
+        for item in self.items.values():
+            self.scene.removeItem(item)
+        self.items.clear()
@@ -1,9 +1,9 @@
-import sys
-from PyQt6.QtWidgets import QApplication
-from quest_master.gui.main_window import MainWindow
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec())
+import sys
+from PyQt6.QtWidgets import QApplication
+from quest_master.gui.main_window import MainWindow
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    sys.exit(app.exec())